@@ -0,0 +1,240 @@
+"""Ambulance lifecycle with explicit transitions and optimistic locking.
+
+Every status change is a compare-and-swap on (status, version), so two
+admins racing for the same ambulance cannot both win. Free ambulances are
+also indexed in memory per hospital, making "any available ambulance"
+an O(1) pop followed by a single CAS.
+
+An ambulance only becomes available again when no active request
+references it: manual moves to 'available' are refused while one does,
+and release() is tied to the request that was completed.
+"""
+import threading
+
+AMBULANCE_STATUSES = ['available', 'assigned', 'in_transit', 'at_patient', 'returning']
+
+# Allowed lifecycle moves; assigned/in_transit can be called off
+AMBULANCE_TRANSITIONS = {
+    'available': {'assigned'},
+    'assigned': {'in_transit', 'available'},
+    'in_transit': {'at_patient', 'returning'},
+    'at_patient': {'returning'},
+    'returning': {'available'},
+}
+
+# States an ambulance may be in while serving a request
+ACTIVE_STATUSES = ('assigned', 'in_transit', 'at_patient', 'returning')
+# Request states that hold on to their ambulance
+ACTIVE_REQUEST_STATUSES = ('assigned', 'in_progress')
+
+_NO_ACTIVE_REQUEST = """
+NOT EXISTS (
+    SELECT 1 FROM emergency_requests er
+    WHERE er.ambulance_id = ambulances.ambulance_id AND er.status IN ('assigned', 'in_progress')
+)
+"""
+
+
+def is_valid_transition(current, new):
+    return new in AMBULANCE_TRANSITIONS.get(current, ())
+
+
+class AmbulanceFleet:
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        # hospital_id -> set of ambulance_ids believed to be available
+        self.available = {}
+        # ambulance_id -> hospital_id for every indexed ambulance
+        self.home = {}
+
+    # Availability index
+    def _hydrate(self, hospital_id):
+        rows = self.db.execute_query(
+            "SELECT ambulance_id FROM ambulances WHERE hospital_id = %s AND status = 'available'",
+            (hospital_id,)
+        ) or []
+        ids = {row['ambulance_id'] for row in rows}
+        with self.lock:
+            self.available[hospital_id] = ids
+            for ambulance_id in ids:
+                self.home[ambulance_id] = hospital_id
+        return ids
+
+    def _index(self, ambulance_id, hospital_id, status):
+        with self.lock:
+            if hospital_id is None:
+                hospital_id = self.home.get(ambulance_id)
+            if hospital_id is None:
+                return
+            self.home[ambulance_id] = hospital_id
+            ids = self.available.get(hospital_id)
+            if ids is None:
+                return
+            if status == 'available':
+                ids.add(ambulance_id)
+            else:
+                ids.discard(ambulance_id)
+
+    def invalidate(self, hospital_id=None):
+        with self.lock:
+            if hospital_id is None:
+                self.available.clear()
+            else:
+                self.available.pop(hospital_id, None)
+
+    def available_count(self, hospital_id):
+        ids = self.available.get(hospital_id)
+        if ids is None:
+            ids = self._hydrate(hospital_id)
+        return len(ids)
+
+    # Transitions
+    def transition(self, ambulance_id, expected_status, new_status, expected_version=None,
+                   hospital_id=None):
+        """Compare-and-swap one ambulance from expected_status to new_status."""
+        if not is_valid_transition(expected_status, new_status):
+            return False, f"Invalid transition: {expected_status} -> {new_status}"
+
+        query = """
+        UPDATE ambulances SET status = %s, version = version + 1
+        WHERE ambulance_id = %s AND status = %s
+        """
+        params = [new_status, ambulance_id, expected_status]
+        if hospital_id is not None:
+            query += " AND hospital_id = %s"
+            params.append(hospital_id)
+        if expected_version is not None:
+            query += " AND version = %s"
+            params.append(expected_version)
+        if new_status == 'available':
+            query += " AND " + _NO_ACTIVE_REQUEST
+
+        if self.db.execute_update(query, tuple(params)) != 1:
+            if new_status == 'available' and self.serving_request(ambulance_id):
+                return False, "Ambulance is serving an active request; complete the request instead"
+            return False, "Ambulance state changed, please retry"
+
+        if new_status == 'in_transit':
+            self._mark_requests_in_progress([ambulance_id])
+        self._index(ambulance_id, hospital_id, new_status)
+        return True, f"Ambulance {new_status}"
+
+    def serving_request(self, ambulance_id):
+        """Active request the ambulance is assigned to, if any."""
+        placeholders = ', '.join(['%s'] * len(ACTIVE_REQUEST_STATUSES))
+        rows = self.db.execute_query(
+            f"SELECT request_id FROM emergency_requests "
+            f"WHERE ambulance_id = %s AND status IN ({placeholders}) LIMIT 1",
+            (ambulance_id,) + ACTIVE_REQUEST_STATUSES
+        )
+        return rows[0]['request_id'] if rows else None
+
+    def _mark_requests_in_progress(self, ambulance_ids, cursor=None):
+        """A request is under way once its ambulance leaves."""
+        placeholders = ', '.join(['%s'] * len(ambulance_ids))
+        query = (
+            f"UPDATE emergency_requests SET status = 'in_progress' "
+            f"WHERE ambulance_id IN ({placeholders}) AND status = 'assigned'"
+        )
+        if cursor is not None:
+            cursor.execute(query, tuple(ambulance_ids))
+        else:
+            self.db.execute_update(query, tuple(ambulance_ids))
+
+    def bulk_transition(self, ambulance_ids, expected_status, new_status, hospital_id=None):
+        """Move many ambulances at once; returns the ids that actually moved."""
+        if not is_valid_transition(expected_status, new_status):
+            return False, f"Invalid transition: {expected_status} -> {new_status}", []
+        if not ambulance_ids:
+            return True, "Nothing to update", []
+
+        placeholders = ', '.join(['%s'] * len(ambulance_ids))
+        select_query = f"""
+        SELECT ambulance_id, hospital_id FROM ambulances
+        WHERE ambulance_id IN ({placeholders}) AND status = %s
+        """
+        params = list(ambulance_ids) + [expected_status]
+        if hospital_id is not None:
+            select_query += " AND hospital_id = %s"
+            params.append(hospital_id)
+        if new_status == 'available':
+            select_query += " AND " + _NO_ACTIVE_REQUEST
+        select_query += " FOR UPDATE"
+
+        with self.db.transaction() as cursor:
+            cursor.execute(select_query, tuple(params))
+            locked = cursor.fetchall()
+            moved = [row['ambulance_id'] for row in locked]
+            if moved:
+                update_placeholders = ', '.join(['%s'] * len(moved))
+                cursor.execute(
+                    f"UPDATE ambulances SET status = %s, version = version + 1 "
+                    f"WHERE ambulance_id IN ({update_placeholders})",
+                    tuple([new_status] + moved)
+                )
+                if new_status == 'in_transit':
+                    self._mark_requests_in_progress(moved, cursor)
+
+        for row in locked:
+            self._index(row['ambulance_id'], row['hospital_id'], new_status)
+        return True, f"{len(moved)} ambulances {new_status}", moved
+
+    def acquire(self, hospital_id, ambulance_id=None):
+        """Claim an ambulance for a request (available -> assigned).
+
+        With no ambulance_id, any free ambulance of the hospital is taken
+        from the in-memory index. Stale index entries simply fail their CAS
+        and are dropped; the index is re-read from the database once if it
+        runs dry.
+        """
+        if ambulance_id is not None:
+            success, _ = self.transition(ambulance_id, 'available', 'assigned', hospital_id=hospital_id)
+            return ambulance_id if success else None
+
+        refreshed = False
+        if hospital_id not in self.available:
+            self._hydrate(hospital_id)
+            refreshed = True
+        while True:
+            with self.lock:
+                ids = self.available.get(hospital_id)
+                candidate = ids.pop() if ids else None
+            if candidate is None:
+                if refreshed:
+                    return None
+                self._hydrate(hospital_id)
+                refreshed = True
+                continue
+            success, _ = self.transition(candidate, 'available', 'assigned', hospital_id=hospital_id)
+            if success:
+                return candidate
+
+    def release(self, request_id, hospital_id=None):
+        """Return a finished request's ambulance to service.
+
+        Only the ambulance referenced by `request_id`, once that request is
+        no longer active, and only if no other active request references
+        it. Returns (success, message, ambulance_id).
+        """
+        placeholders = ', '.join(['%s'] * len(ACTIVE_STATUSES))
+        query = f"""
+        UPDATE ambulances a
+        JOIN emergency_requests er
+            ON er.ambulance_id = a.ambulance_id AND er.request_id = %s
+            AND er.status NOT IN ('assigned', 'in_progress')
+        LEFT JOIN emergency_requests other
+            ON other.ambulance_id = a.ambulance_id AND other.status IN ('assigned', 'in_progress')
+        SET a.status = 'available', a.version = a.version + 1
+        WHERE a.status IN ({placeholders}) AND other.request_id IS NULL
+        """
+        if self.db.execute_update(query, (request_id,) + ACTIVE_STATUSES) != 1:
+            return False, "Ambulance is not active", None
+
+        rows = self.db.execute_query(
+            "SELECT ambulance_id FROM emergency_requests WHERE request_id = %s", (request_id,)
+        )
+        ambulance_id = rows[0]['ambulance_id'] if rows else None
+        if ambulance_id is not None:
+            self._index(ambulance_id, hospital_id, 'available')
+        return True, "Ambulance available", ambulance_id
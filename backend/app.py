@@ -1,32 +1,77 @@
-from flask import Flask, request, jsonify, session
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, session
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 import mysql.connector
-from mysql.connector import Error
-import hashlib
-import os
+from mysql.connector import Error, pooling
 from datetime import datetime
 import math
+import threading
+import time
 from functools import wraps
+from contextlib import contextmanager
 import json
-
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
-CORS(app, supports_credentials=True)
-
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'root',
-    'database': 'rapidaid'
-}
+from config import load_config
+from scheduler import (
+    PRIORITY_LEVELS,
+    DEFAULT_AGING_MINUTES,
+    DEFAULT_MAX_QUEUE_SIZE,
+    SchedulingQueues,
+    validate_priority_weights,
+    parse_max_queue_size,
+    parse_aging_minutes,
+)
+from load_balancer import RegionalLoadBalancer
+from serialization import dumps, json_default, rows_to_records
+from dashboard import DashboardSnapshotService
+from ambulances import AmbulanceFleet, AMBULANCE_STATUSES
+from forecasting import DemandRollups, SurgeForecaster
+from ingress import (
+    TokenBucketLimiter,
+    TTLCache,
+    normalize_phone,
+    request_fingerprint,
+    RequestCoalescer,
+    SUBMIT_RATE_PER_SECOND,
+    SUBMIT_BURST,
+    POLL_RATE_PER_SECOND,
+    POLL_BURST,
+    POLL_IP_RATE_PER_SECOND,
+    POLL_IP_BURST,
+    DUPLICATE_WINDOW_SECONDS,
+    IDEMPOTENCY_TTL_SECONDS,
+    POLL_RESULT_TTL_SECONDS,
+)
+
+# Routes are registered on the app built by create_app()
+api = Blueprint('api', __name__)
 
 class DatabaseManager:
-    def __init__(self):
-        self.config = DB_CONFIG
+    def __init__(self, config=None, pool_size=0):
+        self.config = config
+        self.pool_size = pool_size
+        self.pool = None
+        self.pool_lock = threading.Lock()
 
     def get_connection(self):
-        """Always return a fresh, independent connection."""
+        """Return an independent connection, from the pool when one is configured."""
+        if self.config is None:
+            raise RuntimeError('Database is not configured; use create_app()')
+
+        if self.pool_size:
+            if self.pool is None:
+                with self.pool_lock:
+                    if self.pool is None:
+                        self.pool = pooling.MySQLConnectionPool(
+                            pool_name='rapidaid', pool_size=self.pool_size, **self.config
+                        )
+            try:
+                return self.pool.get_connection()
+            except pooling.PoolError:
+                # Pool exhausted: fall back to a one-off connection
+                pass
+
         return mysql.connector.connect(**self.config)
 
     def execute_query(self, query, params=None, fetch=True):
@@ -77,11 +122,137 @@ class DatabaseManager:
 
             raise
 
-db = DatabaseManager()
+    def execute_update(self, query, params=None):
+        """Run a write and return the number of affected rows."""
+        with self.transaction() as cursor:
+            cursor.execute(query, params or ())
+            return cursor.rowcount
+
+    @contextmanager
+    def transaction(self):
+        """Yield a dictionary cursor on one connection; commit on success, roll back on error."""
+        conn = self.get_connection()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True)
+            yield cursor
+            conn.commit()
+        except Exception as e:
+            print("Database Error:", repr(e))
+            try:
+                conn.rollback()
+            except:
+                pass
+            raise
+        finally:
+            try:
+                if cursor:
+                    cursor.close()
+            except:
+                pass
+
+            try:
+                conn.close()
+            except:
+                pass
+
+    def fetch_records(self, query, params=None):
+        """Fetch with a tuple cursor and convert columns in bulk for JSON output."""
+        if params is None:
+            params_tuple = ()
+        elif isinstance(params, (list, tuple)):
+            params_tuple = tuple(params)
+        else:
+            params_tuple = (params,)
+
+        conn = None
+        cursor = None
+
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(query, params_tuple)
+            rows = cursor.fetchall()
+            columns = cursor.column_names
+            return rows_to_records(columns, rows)
+
+        except Exception as e:
+            print("Database Error:", repr(e))
+            raise
+
+        finally:
+            try:
+                if cursor:
+                    cursor.close()
+            except:
+                pass
+
+            try:
+                if conn:
+                    conn.close()
+            except:
+                pass
+
+class AppServices:
+    """Database, caches and in-memory indexes owned by one app instance"""
+
+    def __init__(self, config):
+        self.db = DatabaseManager(config['DB_CONFIG'], config['DB_POOL_SIZE'])
+        self.scheduling_queues = SchedulingQueues(self.db)
+        self.load_balancer = RegionalLoadBalancer(self.db)
+        self.dashboard_snapshots = DashboardSnapshotService(self.db)
+        self.ambulance_fleet = AmbulanceFleet(self.db)
+        self.demand_rollups = DemandRollups(self.db)
+        self.surge_forecaster = SurgeForecaster(self.demand_rollups)
+
+        # Ingress protection for the unauthenticated patient endpoints
+        self.submit_limiter = TokenBucketLimiter(SUBMIT_RATE_PER_SECOND, SUBMIT_BURST)
+        self.poll_limiter = TokenBucketLimiter(POLL_RATE_PER_SECOND, POLL_BURST)
+        self.poll_ip_limiter = TokenBucketLimiter(POLL_IP_RATE_PER_SECOND, POLL_IP_BURST)
+        self.recent_submissions = TTLCache(DUPLICATE_WINDOW_SECONDS)
+        self.idempotent_responses = TTLCache(IDEMPOTENCY_TTL_SECONDS)
+        self.submission_coalescer = RequestCoalescer()
+        self.history_coalescer = RequestCoalescer(ttl=POLL_RESULT_TTL_SECONDS)
+
+        # Startup hydration state, reported by the health check
+        self.startup_state = {'started_at': None, 'hydrating': False, 'ready': False, 'error': None}
+
+def get_services(app=None):
+    """Services of `app`, or of the app handling the current request"""
+    return (app or current_app).extensions['rapidaid']
+
+def _service(name):
+    return LocalProxy(lambda: getattr(get_services(), name))
+
+# Module-level names resolve to the current app's services, so each app
+# built by create_app() (and each test) has its own state
+db = _service('db')
+scheduling_queues = _service('scheduling_queues')
+load_balancer = _service('load_balancer')
+dashboard_snapshots = _service('dashboard_snapshots')
+ambulance_fleet = _service('ambulance_fleet')
+demand_rollups = _service('demand_rollups')
+surge_forecaster = _service('surge_forecaster')
+submit_limiter = _service('submit_limiter')
+poll_limiter = _service('poll_limiter')
+poll_ip_limiter = _service('poll_ip_limiter')
+recent_submissions = _service('recent_submissions')
+idempotent_responses = _service('idempotent_responses')
+submission_coalescer = _service('submission_coalescer')
+history_coalescer = _service('history_coalescer')
+startup_state = _service('startup_state')
 
 # Supported scheduling algorithms
 ALLOWED_SCHEDULING_ALGORITHMS = ['priority', 'fcfs', 'sjf', 'hrrn']
 
+class JSONProvider(DefaultJSONProvider):
+    """jsonify() with the fast serializer's conversions (Decimal -> number)"""
+    default = staticmethod(json_default)
+
+def json_response(obj, status=200):
+    """Like jsonify(), but encoded with the fast serializer"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
 # Authentication middleware
 def login_required(f):
     @wraps(f)
@@ -156,22 +327,8 @@ def determine_priority(symptoms):
 class SchedulingAlgorithms:
     @staticmethod
     def priority_scheduling(requests, hospital_id):
-        """Priority-based scheduling algorithm"""
-        query = """
-        SELECT er.*, p.name as patient_name, p.phone 
-        FROM emergency_requests er 
-        JOIN patients p ON er.patient_id = p.patient_id 
-        WHERE er.hospital_id = %s AND er.status = 'pending'
-        ORDER BY 
-            CASE er.priority_level
-                WHEN 'critical' THEN 1
-                WHEN 'high' THEN 2
-                WHEN 'medium' THEN 3
-                WHEN 'low' THEN 4
-            END,
-            er.created_at ASC
-        """
-        return db.execute_query(query, (hospital_id,))
+        """Weighted priority scheduling with aging (score = weight x f(wait time))"""
+        return scheduling_queues.get(hospital_id).ordered()
     
     @staticmethod
     def hrrn_scheduling(requests, hospital_id):
@@ -188,7 +345,7 @@ class SchedulingAlgorithms:
         WHERE er.hospital_id = %s AND er.status = 'pending'
         ORDER BY response_ratio DESC, er.created_at ASC
         """
-        return db.execute_query(query, (hospital_id,))
+        return db.fetch_records(query, (hospital_id,))
     
     @staticmethod
     def fcfs_scheduling(requests, hospital_id):
@@ -200,7 +357,7 @@ class SchedulingAlgorithms:
         WHERE er.hospital_id = %s AND er.status = 'pending'
         ORDER BY er.created_at ASC
         """
-        return db.execute_query(query, (hospital_id,))
+        return db.fetch_records(query, (hospital_id,))
     
     @staticmethod
     def sjf_scheduling(requests, hospital_id):
@@ -214,7 +371,7 @@ class SchedulingAlgorithms:
         WHERE er.hospital_id = %s AND er.status = 'pending'
         ORDER BY er.distance_to_hospital ASC, er.created_at ASC
         """
-        return db.execute_query(query, (hospital_id,))
+        return db.fetch_records(query, (hospital_id,))
 
 # Banker's Algorithm for Deadlock Avoidance
 class BankersAlgorithm:
@@ -264,26 +421,31 @@ class BankersAlgorithm:
         if not is_safe:
             return False, message
         
-        # Update hospital resources
-        for resource_type, count in requested_resources.items():
-            if resource_type == 'ambulance':
-                query = "UPDATE hospitals SET available_ambulances = available_ambulances - %s WHERE hospital_id = %s"
-            elif resource_type == 'doctor':
-                query = "UPDATE hospitals SET available_doctors = available_doctors - %s WHERE hospital_id = %s"
-            elif resource_type == 'room':
-                query = "UPDATE hospitals SET available_rooms = available_rooms - %s WHERE hospital_id = %s"
-            else:
-                continue
-            
-            db.execute_query(query, (count, self.hospital_id), fetch=False)
-        
-        # Record allocation
-        for resource_type, count in requested_resources.items():
-            query = """
-            INSERT INTO resource_allocation (request_id, hospital_id, resource_type, allocated_count, max_needed, status)
-            VALUES (%s, %s, %s, %s, %s, 'allocated')
-            """
-            db.execute_query(query, (request_id, self.hospital_id, resource_type, count, count), fetch=False)
+        # Take every resource in one guarded update so concurrent
+        # allocations cannot drive availability below zero; the allocation
+        # rows commit with it, so a failure leaves neither behind
+        columns = {'ambulance': 'available_ambulances', 'doctor': 'available_doctors', 'room': 'available_rooms'}
+        counts = {
+            columns[resource_type]: count
+            for resource_type, count in requested_resources.items()
+            if resource_type in columns and count
+        }
+        with db.transaction() as cursor:
+            if counts:
+                set_clause = ', '.join(f"{column} = {column} - %s" for column in counts)
+                guard = ' AND '.join(f"{column} >= %s" for column in counts)
+                query = f"UPDATE hospitals SET {set_clause} WHERE hospital_id = %s AND {guard}"
+                cursor.execute(query, tuple(counts.values()) + (self.hospital_id,) + tuple(counts.values()))
+                if cursor.rowcount != 1:
+                    return False, "Resources were taken concurrently, please retry"
+
+            # Record allocation
+            for resource_type, count in requested_resources.items():
+                query = """
+                INSERT INTO resource_allocation (request_id, hospital_id, resource_type, allocated_count, max_needed, status)
+                VALUES (%s, %s, %s, %s, %s, 'allocated')
+                """
+                cursor.execute(query, (request_id, self.hospital_id, resource_type, count, count))
         
         return True, "Resources allocated successfully"
     
@@ -320,7 +482,7 @@ class BankersAlgorithm:
         return True, "Resources released successfully"
 
 # Authentication Routes
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
     username = data.get('username')
@@ -354,7 +516,7 @@ def login():
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 def logout():
     if 'user_id' in session:
         log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
@@ -363,7 +525,7 @@ def logout():
     session.clear()
     return jsonify({'message': 'Logged out successfully'})
 
-@app.route('/api/current_user', methods=['GET'])
+@api.route('/api/current_user', methods=['GET'])
 def current_user():
     if 'user_id' in session:
         return jsonify({
@@ -374,7 +536,7 @@ def current_user():
     return jsonify({'error': 'Not authenticated'}), 401
 
 # Hospital Routes
-@app.route('/api/hospitals', methods=['GET'])
+@api.route('/api/hospitals', methods=['GET'])
 def get_hospitals():
     query = """
     SELECT h.*, hs.algorithm as scheduling_algorithm,
@@ -385,10 +547,25 @@ def get_hospitals():
     GROUP BY h.hospital_id
     ORDER BY h.name
     """
-    hospitals = db.execute_query(query)
-    return jsonify(hospitals)
+    hospitals = db.fetch_records(query)
+    return json_response(hospitals)
 
-@app.route('/api/hospitals/<int:hospital_id>', methods=['GET'])
+@api.route('/api/hospitals/recommend', methods=['GET'])
+def recommend_hospitals():
+    """Hospitals ranked by expected response time for a patient location"""
+    try:
+        latitude = float(request.args.get('latitude'))
+        longitude = float(request.args.get('longitude'))
+        limit = int(request.args.get('limit', 5))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Valid latitude and longitude are required'}), 400
+
+    try:
+        return jsonify(load_balancer.recommend(latitude, longitude, limit))
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@api.route('/api/hospitals/<int:hospital_id>', methods=['GET'])
 def get_hospital(hospital_id):
     query = """
     SELECT h.*, hs.algorithm as scheduling_algorithm, hs.priority_weights
@@ -401,7 +578,7 @@ def get_hospital(hospital_id):
         return jsonify(result[0])
     return jsonify({'error': 'Hospital not found'}), 404
 
-@app.route('/api/hospitals/<int:hospital_id>/algorithm', methods=['PUT'])
+@api.route('/api/hospitals/<int:hospital_id>/algorithm', methods=['PUT'])
 @role_required('superadmin')
 def update_hospital_algorithm(hospital_id):
     data = request.get_json() or {}
@@ -424,6 +601,9 @@ def update_hospital_algorithm(hospital_id):
             query = "INSERT INTO hospital_scheduling (hospital_id, algorithm) VALUES (%s, %s)"
             db.execute_query(query, (hospital_id, algorithm), fetch=False)
 
+        scheduling_queues.invalidate(hospital_id)
+        dashboard_snapshots.mark_changed()
+
         if 'user_id' in session:
             log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
             db.execute_query(
@@ -436,7 +616,51 @@ def update_hospital_algorithm(hospital_id):
     except Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-@app.route('/api/hospitals', methods=['POST'])
+@api.route('/api/hospitals/<int:hospital_id>/scheduling', methods=['PUT'])
+@role_required('superadmin')
+def update_hospital_scheduling(hospital_id):
+    data = request.get_json() or {}
+
+    set_clauses = []
+    params = []
+    try:
+        if 'priority_weights' in data:
+            set_clauses.append("priority_weights = %s")
+            params.append(json.dumps(validate_priority_weights(data['priority_weights'])))
+        if 'max_queue_size' in data:
+            set_clauses.append("max_queue_size = %s")
+            params.append(parse_max_queue_size(data['max_queue_size']))
+        if 'aging_minutes' in data:
+            set_clauses.append("aging_minutes = %s")
+            params.append(parse_aging_minutes(data['aging_minutes']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not set_clauses:
+        return jsonify({'error': 'No fields to update'}), 400
+
+    params.append(hospital_id)
+
+    try:
+        query = f"UPDATE hospital_scheduling SET {', '.join(set_clauses)} WHERE hospital_id = %s"
+        db.execute_query(query, tuple(params), fetch=False)
+        scheduling_queues.invalidate(hospital_id)
+        load_balancer.invalidate()
+        dashboard_snapshots.mark_changed()
+
+        if 'user_id' in session:
+            log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
+            db.execute_query(
+                log_query,
+                (session['user_id'], 'UPDATE_SCHEDULING', f'Updated scheduling settings for hospital {hospital_id}'),
+                fetch=False,
+            )
+
+        return jsonify({'message': 'Scheduling settings updated successfully'})
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@api.route('/api/hospitals', methods=['POST'])
 @role_required('superadmin')
 def create_hospital():
     data = request.get_json()
@@ -445,6 +669,15 @@ def create_hospital():
     for field in required_fields:
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
+
+    try:
+        max_queue_size = parse_max_queue_size(data.get('max_queue_size', DEFAULT_MAX_QUEUE_SIZE))
+        aging_minutes = parse_aging_minutes(data.get('aging_minutes', DEFAULT_AGING_MINUTES))
+        priority_weights = validate_priority_weights(
+            {} if data.get('priority_weights') is None else data['priority_weights']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         # Insert hospital
@@ -469,13 +702,17 @@ def create_hospital():
         algorithm = data.get('scheduling_algorithm', 'priority')
         if algorithm not in ALLOWED_SCHEDULING_ALGORITHMS:
             algorithm = 'priority'
-        priority_weights = data.get('priority_weights', '{"critical": 4, "high": 3, "medium": 2, "low": 1}')
-        
         scheduling_query = """
-        INSERT INTO hospital_scheduling (hospital_id, algorithm, priority_weights)
-        VALUES (%s, %s, %s)
+        INSERT INTO hospital_scheduling (hospital_id, algorithm, priority_weights, max_queue_size, aging_minutes)
+        VALUES (%s, %s, %s, %s, %s)
         """
-        db.execute_query(scheduling_query, (hospital_id, algorithm, priority_weights), fetch=False)
+        db.execute_query(
+            scheduling_query,
+            (hospital_id, algorithm, json.dumps(priority_weights), max_queue_size, aging_minutes),
+            fetch=False,
+        )
+        load_balancer.invalidate()
+        dashboard_snapshots.mark_changed()
         
         # Log the action
         if 'user_id' in session:
@@ -487,7 +724,7 @@ def create_hospital():
     except Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-@app.route('/api/hospitals/<int:hospital_id>', methods=['PUT'])
+@api.route('/api/hospitals/<int:hospital_id>', methods=['PUT'])
 @role_required('superadmin')
 def update_hospital(hospital_id):
     data = request.get_json() or {}
@@ -513,6 +750,8 @@ def update_hospital(hospital_id):
     query = f"UPDATE hospitals SET {', '.join(set_clauses)} WHERE hospital_id = %s"
     try:
         db.execute_query(query, tuple(params), fetch=False)
+        load_balancer.invalidate()
+        dashboard_snapshots.mark_changed()
 
         if 'user_id' in session:
             log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
@@ -526,12 +765,16 @@ def update_hospital(hospital_id):
     except Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-@app.route('/api/hospitals/<int:hospital_id>', methods=['DELETE'])
+@api.route('/api/hospitals/<int:hospital_id>', methods=['DELETE'])
 @role_required('superadmin')
 def delete_hospital(hospital_id):
     try:
         query = "DELETE FROM hospitals WHERE hospital_id = %s"
         db.execute_query(query, (hospital_id,), fetch=False)
+        scheduling_queues.invalidate(hospital_id)
+        load_balancer.invalidate()
+        ambulance_fleet.invalidate(hospital_id)
+        dashboard_snapshots.mark_changed()
 
         if 'user_id' in session:
             log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
@@ -546,15 +789,72 @@ def delete_hospital(hospital_id):
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
 # Emergency Request Routes
-@app.route('/api/emergency_requests', methods=['POST'])
+@api.route('/api/emergency_requests', methods=['POST'])
 def create_emergency_request():
-    data = request.get_json()
+    data = request.get_json() or {}
     
     required_fields = ['symptoms', 'latitude', 'longitude', 'hospital_id', 'name', 'phone']
     for field in required_fields:
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
-    
+
+    raw_hospital_id = data['hospital_id']
+    try:
+        if isinstance(raw_hospital_id, bool) or (
+                isinstance(raw_hospital_id, float) and not raw_hospital_id.is_integer()):
+            raise ValueError(raw_hospital_id)
+        data['hospital_id'] = int(raw_hospital_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'hospital_id must be an integer'}), 400
+
+    phone = data['phone'] = normalize_phone(data['phone'])
+    duplicate_key = (phone, data['hospital_id'])
+
+    # Retries with the same idempotency key get the original answer back.
+    # Keys are scoped to the phone so two clients cannot collide, and a
+    # reused key with a different body is refused rather than replayed.
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    fingerprint = None
+    if idempotency_key:
+        idempotency_key = (phone, str(idempotency_key))
+        fingerprint = request_fingerprint(data)
+        replay = idempotent_responses.get(idempotency_key)
+        if replay is not None:
+            if replay[0] != fingerprint:
+                return jsonify({'error': 'Idempotency key was already used for a different request'}), 422
+            return jsonify(replay[1]), replay[2]
+
+    def submit():
+        # Same phone + hospital within the window is the same emergency
+        existing = recent_submissions.get(duplicate_key)
+        if existing is not None:
+            return dict(existing, duplicate=True), 200
+
+        # Per phone only; see SUBMIT_RATE_PER_SECOND for why not per IP
+        allowed, retry_after = submit_limiter.allow(phone)
+        if not allowed:
+            return {'error': 'Too many requests, please wait before retrying',
+                    'retry_after': math.ceil(retry_after)}, 429
+
+        payload, status = submit_emergency_request(data)
+        if status == 201:
+            recent_submissions.set(duplicate_key, payload)
+            history_coalescer.forget(phone)
+        return payload, status
+
+    # Identical submissions in flight at the same time share one insert
+    payload, status = submission_coalescer.run(duplicate_key, submit)
+
+    if idempotency_key and status < 500 and status != 429:
+        idempotent_responses.set(idempotency_key, (fingerprint, payload, status))
+
+    response = jsonify(payload)
+    if status == 429:
+        response.headers['Retry-After'] = str(payload['retry_after'])
+    return response, status
+
+def submit_emergency_request(data):
+    """Create the emergency request; returns (payload, status)"""
     try:
         # Find or create a patient profile based on phone number (no login required)
         patient_query = "SELECT patient_id FROM patients WHERE phone = %s ORDER BY patient_id DESC LIMIT 1"
@@ -571,14 +871,41 @@ def create_emergency_request():
         priority_level = determine_priority(data['symptoms'])
         
         # Calculate distance to hospital
+        hospital_id = data['hospital_id']
         hospital_query = "SELECT latitude, longitude FROM hospitals WHERE hospital_id = %s"
-        hospital_result = db.execute_query(hospital_query, (data['hospital_id'],))
+        hospital_result = db.execute_query(hospital_query, (hospital_id,))
         
         if not hospital_result:
-            return jsonify({'error': 'Hospital not found'}), 404
+            return {'error': 'Hospital not found'}, 404
         
         hospital_lat = hospital_result[0]['latitude']
         hospital_lon = hospital_result[0]['longitude']
+
+        # Admission control: redirect overflow to the best hospital with capacity,
+        # otherwise reroute (if the patient allows it) or recommend a faster one
+        redirected_from = None
+        recommended_hospital = None
+        if scheduling_queues.is_full(hospital_id):
+            # Overflow goes to the best hospital with room, however far
+            alternative, _ = load_balancer.best_alternative(
+                data['latitude'], data['longitude'], hospital_id, min_saving=None, max_km=None
+            )
+            if not alternative:
+                return {'error': 'All hospitals are at capacity, please call emergency services'}, 503
+        else:
+            alternative, minutes_saved = load_balancer.best_alternative(
+                data['latitude'], data['longitude'], hospital_id
+            )
+            if alternative and not data.get('allow_reroute'):
+                recommended_hospital = dict(alternative, minutes_saved=minutes_saved)
+                alternative = None
+
+        if alternative:
+            redirected_from = hospital_id
+            hospital_id = alternative['hospital_id']
+            hospital_lat = alternative['latitude']
+            hospital_lon = alternative['longitude']
+
         distance = calculate_distance(data['latitude'], data['longitude'], hospital_lat, hospital_lon)
         
         # Estimate arrival time (simplified: 3 minutes per km)
@@ -591,29 +918,35 @@ def create_emergency_request():
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
         params = (
-            patient_id, data['hospital_id'], data['symptoms'], priority_level,
+            patient_id, hospital_id, data['symptoms'], priority_level,
             data['latitude'], data['longitude'], distance, estimated_arrival
         )
         
         request_id = db.execute_query(query, params, fetch=False)
+        scheduling_queues.add_request(hospital_id, request_id)
+        load_balancer.request_created(hospital_id)
+        dashboard_snapshots.mark_changed()
         
         # Log the action (if a logged-in user exists; anonymous patients will have no session)
         if 'user_id' in session:
             log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
             db.execute_query(log_query, (session['user_id'], 'CREATE_REQUEST', f'Emergency request created: {data["symptoms"][:50]}'), fetch=False)
         
-        return jsonify({
+        return {
             'message': 'Emergency request created successfully',
             'request_id': request_id,
+            'hospital_id': hospital_id,
+            'redirected_from': redirected_from,
+            'recommended_hospital': recommended_hospital,
             'priority_level': priority_level,
             'distance_to_hospital': distance,
             'estimated_arrival_time': estimated_arrival
-        }), 201
+        }, 201
         
     except Error as e:
-        return jsonify({'error': f'Database error: {str(e)}'}), 500
+        return {'error': f'Database error: {str(e)}'}, 500
 
-@app.route('/api/emergency_requests/<int:hospital_id>/queue', methods=['GET'])
+@api.route('/api/emergency_requests/<int:hospital_id>/queue', methods=['GET'])
 @role_required('hospital_admin', 'superadmin')
 def get_request_queue(hospital_id):
     # Get hospital's scheduling algorithm
@@ -637,17 +970,15 @@ def get_request_queue(hospital_id):
     else:
         requests = []
     
-    return jsonify(requests)
+    return json_response(requests)
 
-@app.route('/api/emergency_requests/<int:request_id>/assign', methods=['POST'])
+@api.route('/api/emergency_requests/<int:request_id>/assign', methods=['POST'])
 @role_required('hospital_admin')
 def assign_ambulance(request_id):
-    data = request.get_json()
+    data = request.get_json() or {}
+    # Without an ambulance_id any available ambulance of the hospital is used
     ambulance_id = data.get('ambulance_id')
     
-    if not ambulance_id:
-        return jsonify({'error': 'Ambulance ID required'}), 400
-    
     try:
         # Get request details
         request_query = "SELECT * FROM emergency_requests WHERE request_id = %s"
@@ -658,49 +989,73 @@ def assign_ambulance(request_id):
         
         emergency_request = request_result[0]
         hospital_id = emergency_request['hospital_id']
+
+        if emergency_request['status'] != 'pending':
+            return jsonify({'error': 'Request is not pending'}), 409
         
-        # Check if ambulance is available
-        ambulance_query = "SELECT * FROM ambulances WHERE ambulance_id = %s AND hospital_id = %s AND status = 'available'"
-        ambulance_result = db.execute_query(ambulance_query, (ambulance_id, hospital_id))
-        
-        if not ambulance_result:
-            return jsonify({'error': 'Ambulance not available'}), 400
-        
-        # Apply Banker's Algorithm for resource allocation
-        banker = BankersAlgorithm(hospital_id)
-        requested_resources = {
-            'ambulance': 1,
-            'doctor': 1,
-            'room': 1 if emergency_request['priority_level'] in ['critical', 'high'] else 0
-        }
-        
-        allocation_success, allocation_message = banker.allocate_resources(request_id, requested_resources)
-        
+        # Claim the ambulance (compare-and-swap available -> assigned)
+        ambulance_id = ambulance_fleet.acquire(hospital_id, ambulance_id)
+        if not ambulance_id:
+            return jsonify({'error': 'Ambulance not available'}), 409
+
+        try:
+            # Claim the request the same way so it cannot be assigned twice
+            update_request_query = """
+            UPDATE emergency_requests 
+            SET status = 'assigned', ambulance_id = %s, assigned_at = NOW() 
+            WHERE request_id = %s AND status = 'pending'
+            """
+            if db.execute_update(update_request_query, (ambulance_id, request_id)) != 1:
+                release_assignment_claim(request_id, ambulance_id, hospital_id)
+                return jsonify({'error': 'Request was already assigned'}), 409
+
+            # Apply Banker's Algorithm for resource allocation
+            banker = BankersAlgorithm(hospital_id)
+            requested_resources = {
+                'ambulance': 1,
+                'doctor': 1,
+                'room': 1 if emergency_request['priority_level'] in ['critical', 'high'] else 0
+            }
+
+            allocation_success, allocation_message = banker.allocate_resources(request_id, requested_resources)
+        except Exception as e:
+            release_assignment_claim(request_id, ambulance_id, hospital_id)
+            return jsonify({'error': f'Assignment failed: {str(e)}'}), 500
+
         if not allocation_success:
+            release_assignment_claim(request_id, ambulance_id, hospital_id)
             return jsonify({'error': allocation_message}), 400
-        
-        # Update ambulance status
-        update_ambulance_query = "UPDATE ambulances SET status = 'assigned' WHERE ambulance_id = %s"
-        db.execute_query(update_ambulance_query, (ambulance_id,), fetch=False)
-        
-        # Update request status
-        update_request_query = """
-        UPDATE emergency_requests 
-        SET status = 'assigned', ambulance_id = %s, assigned_at = NOW() 
-        WHERE request_id = %s
-        """
-        db.execute_query(update_request_query, (ambulance_id, request_id), fetch=False)
+        scheduling_queues.remove_request(hospital_id, request_id)
+        load_balancer.request_assigned(hospital_id)
+        dashboard_snapshots.mark_changed()
         
         # Log the action
         log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
         db.execute_query(log_query, (session['user_id'], 'ASSIGN_AMBULANCE', f'Ambulance {ambulance_id} assigned to request {request_id}'), fetch=False)
         
-        return jsonify({'message': 'Ambulance assigned successfully'})
+        return jsonify({'message': 'Ambulance assigned successfully', 'ambulance_id': ambulance_id})
         
     except Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-@app.route('/api/emergency_requests/<int:request_id>/complete', methods=['POST'])
+def release_assignment_claim(request_id, ambulance_id, hospital_id):
+    """Undo a partial assignment: request back to pending, then free the ambulance"""
+    revert_request_query = """
+    UPDATE emergency_requests
+    SET status = 'pending', ambulance_id = NULL, assigned_at = NULL
+    WHERE request_id = %s AND ambulance_id = %s AND status = 'assigned'
+    """
+    try:
+        db.execute_update(revert_request_query, (request_id, ambulance_id))
+    except Exception as e:
+        print("Database Error:", e)
+    # Refused while an active request still holds the ambulance
+    try:
+        ambulance_fleet.transition(ambulance_id, 'assigned', 'available', hospital_id=hospital_id)
+    except Exception as e:
+        print("Database Error:", e)
+
+@api.route('/api/emergency_requests/<int:request_id>/complete', methods=['POST'])
 @role_required('hospital_admin')
 def complete_request(request_id):
     try:
@@ -717,19 +1072,22 @@ def complete_request(request_id):
         ambulance_id = emergency_request.get('ambulance_id')
         hospital_id = emergency_request['hospital_id']
 
-        if ambulance_id:
-            update_ambulance_query = "UPDATE ambulances SET status = 'available' WHERE ambulance_id = %s"
-            db.execute_query(update_ambulance_query, (ambulance_id,), fetch=False)
-
-        banker = BankersAlgorithm(hospital_id)
-        banker.release_resources(request_id)
-
+        # Only one caller may complete the request and release its resources
         update_request_query = """
         UPDATE emergency_requests
         SET status = 'completed', completed_at = NOW()
-        WHERE request_id = %s
+        WHERE request_id = %s AND status IN ('assigned', 'in_progress')
         """
-        db.execute_query(update_request_query, (request_id,), fetch=False)
+        if db.execute_update(update_request_query, (request_id,)) != 1:
+            return jsonify({'error': 'Request is not active'}), 409
+
+        if ambulance_id:
+            ambulance_fleet.release(request_id, hospital_id)
+
+        banker = BankersAlgorithm(hospital_id)
+        banker.release_resources(request_id)
+        load_balancer.request_completed(hospital_id)
+        dashboard_snapshots.mark_changed()
 
         if 'user_id' in session:
             log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
@@ -743,14 +1101,90 @@ def complete_request(request_id):
     except Error as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-@app.route('/api/ambulances/<int:hospital_id>', methods=['GET'])
+@api.route('/api/ambulances/<int:hospital_id>', methods=['GET'])
 @role_required('hospital_admin')
 def get_ambulances(hospital_id):
     query = "SELECT * FROM ambulances WHERE hospital_id = %s ORDER BY vehicle_number"
     ambulances = db.execute_query(query, (hospital_id,))
     return jsonify(ambulances)
 
-@app.route('/api/hospitals/<int:hospital_id>/status', methods=['GET'])
+@api.route('/api/ambulances/<int:ambulance_id>/status', methods=['POST'])
+@role_required('hospital_admin')
+def update_ambulance_status(ambulance_id):
+    data = request.get_json() or {}
+    new_status = data.get('status')
+    expected_status = data.get('expected_status')
+    expected_version = data.get('version')
+
+    if new_status not in AMBULANCE_STATUSES:
+        return jsonify({'error': 'Invalid status'}), 400
+
+    try:
+        if expected_status is None:
+            current = db.execute_query(
+                "SELECT status, version FROM ambulances WHERE ambulance_id = %s", (ambulance_id,)
+            )
+            if not current:
+                return jsonify({'error': 'Ambulance not found'}), 404
+            expected_status = current[0]['status']
+            if expected_version is None:
+                expected_version = current[0]['version']
+
+        success, message = ambulance_fleet.transition(
+            ambulance_id, expected_status, new_status, expected_version
+        )
+        if not success:
+            return jsonify({'error': message}), 409
+        # The fleet marks the ambulance's request in_progress on in_transit
+        dashboard_snapshots.mark_changed()
+
+        if 'user_id' in session:
+            log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
+            db.execute_query(
+                log_query,
+                (session['user_id'], 'AMBULANCE_STATUS', f'Ambulance {ambulance_id}: {expected_status} -> {new_status}'),
+                fetch=False,
+            )
+
+        return jsonify({'message': message})
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@api.route('/api/ambulances/status', methods=['POST'])
+@role_required('hospital_admin')
+def bulk_update_ambulance_status():
+    data = request.get_json() or {}
+    ambulance_ids = data.get('ambulance_ids') or []
+    expected_status = data.get('expected_status')
+    new_status = data.get('status')
+
+    if not isinstance(ambulance_ids, list):
+        return jsonify({'error': 'ambulance_ids must be a list'}), 400
+    if expected_status not in AMBULANCE_STATUSES or new_status not in AMBULANCE_STATUSES:
+        return jsonify({'error': 'Invalid status'}), 400
+
+    try:
+        success, message, moved = ambulance_fleet.bulk_transition(
+            ambulance_ids, expected_status, new_status, data.get('hospital_id')
+        )
+        if not success:
+            return jsonify({'error': message}), 400
+        if moved:
+            dashboard_snapshots.mark_changed()
+
+        if moved and 'user_id' in session:
+            log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
+            db.execute_query(
+                log_query,
+                (session['user_id'], 'AMBULANCE_STATUS', f'{len(moved)} ambulances: {expected_status} -> {new_status}'),
+                fetch=False,
+            )
+
+        return jsonify({'message': message, 'updated': moved})
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@api.route('/api/hospitals/<int:hospital_id>/status', methods=['GET'])
 @role_required('hospital_admin', 'superadmin')
 def get_hospital_status(hospital_id):
     hospital_query = """
@@ -794,19 +1228,73 @@ def get_hospital_status(hospital_id):
 
     return jsonify(response)
 
+@api.route('/api/hospitals/<int:hospital_id>/forecast', methods=['GET'])
+@role_required('hospital_admin', 'superadmin')
+def get_hospital_forecast(hospital_id):
+    try:
+        hours = int(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({'error': 'hours must be an integer'}), 400
+    hours = max(1, min(hours, 7 * 24))
+
+    try:
+        hospital_query = """
+        SELECT hospital_id, name, total_ambulances, total_doctors, total_rooms
+        FROM hospitals WHERE hospital_id = %s
+        """
+        hospital = db.execute_query(hospital_query, (hospital_id,))
+        if not hospital:
+            return jsonify({'error': 'Hospital not found'}), 404
+
+        hourly, trend = surge_forecaster.forecast(hospital_id, hours)
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+    recommended = surge_forecaster.recommend_staffing(hourly)
+    current = hospital[0]
+
+    return json_response({
+        'hospital_id': hospital_id,
+        'name': current['name'],
+        'trend': round(trend, 3),
+        'forecast': hourly,
+        'recommended_staffing': recommended,
+        'current_staffing': {
+            'ambulances': current['total_ambulances'],
+            'doctors': current['total_doctors'],
+            'rooms': current['total_rooms'],
+        },
+    })
+
 # Patient Routes
-@app.route('/api/patient/requests', methods=['GET'])
+@api.route('/api/patient/requests', methods=['GET'])
 def get_patient_requests():
     # Identify patient by phone number (no authentication required)
-    phone = request.args.get('phone')
+    phone = normalize_phone(request.args.get('phone') or '')
     if not phone:
         return jsonify({'error': 'Phone number is required'}), 400
 
+    # remote_addr is the real client when create_app() trusts the proxy (PROXY_COUNT)
+    client_ip = request.remote_addr or 'unknown'
+    for limiter, limit_key in ((poll_limiter, phone), (poll_ip_limiter, client_ip)):
+        allowed, retry_after = limiter.allow(limit_key)
+        if not allowed:
+            response = jsonify({'error': 'Too many requests, please slow down'})
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
+
+    # Identical polls arriving together share one pair of queries
+    requests = history_coalescer.run(phone, lambda: fetch_patient_requests(phone))
+    if requests is None:
+        return jsonify({'error': 'Patient profile not found'}), 404
+    return json_response(requests)
+
+def fetch_patient_requests(phone):
     patient_query = "SELECT patient_id FROM patients WHERE phone = %s ORDER BY patient_id DESC LIMIT 1"
     patient_result = db.execute_query(patient_query, (phone,))
     
     if not patient_result:
-        return jsonify({'error': 'Patient profile not found'}), 404
+        return None
     
     patient_id = patient_result[0]['patient_id']
     
@@ -818,42 +1306,320 @@ def get_patient_requests():
     WHERE er.patient_id = %s
     ORDER BY er.created_at DESC
     """
-    requests = db.execute_query(query, (patient_id,))
-    return jsonify(requests)
+    return db.fetch_records(query, (patient_id,))
 
 # SuperAdmin Routes
-@app.route('/api/admin/dashboard', methods=['GET'])
+@api.route('/api/admin/dashboard', methods=['GET'])
 @role_required('superadmin')
 def get_admin_dashboard():
-    # Get system statistics
-    stats_query = """
-    SELECT 
-        COUNT(DISTINCT h.hospital_id) as total_hospitals,
-        SUM(h.total_ambulances) as total_ambulances,
-        SUM(h.available_ambulances) as available_ambulances,
-        COUNT(CASE WHEN er.status = 'pending' THEN 1 END) as pending_requests,
-        COUNT(CASE WHEN er.status = 'in_progress' THEN 1 END) as active_requests,
-        COUNT(CASE WHEN er.status = 'completed' THEN 1 END) as completed_requests
-    FROM hospitals h
-    LEFT JOIN emergency_requests er ON h.hospital_id = er.hospital_id
-    """
-    stats = db.execute_query(stats_query)
-    
-    # Get recent requests
-    recent_query = """
-    SELECT er.*, p.name as patient_name, h.name as hospital_name
-    FROM emergency_requests er
-    JOIN patients p ON er.patient_id = p.patient_id
-    LEFT JOIN hospitals h ON er.hospital_id = h.hospital_id
-    ORDER BY er.created_at DESC
-    LIMIT 10
+    try:
+        snapshot = dashboard_snapshots.get()
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+    response = Response(snapshot.body, mimetype='application/json')
+    response.headers['X-Snapshot-Version'] = str(snapshot.version)
+    response.headers['X-Snapshot-Generated-At'] = snapshot.generated_at
+    return response
+
+REBALANCE_CHUNK_SIZE = 500
+
+def apply_rebalance_moves(moves):
+    """Apply planned moves in one transaction; returns the moves that applied.
+
+    Requests are locked first and a move is kept only if its request is
+    still pending at the planned source hospital, so requests assigned or
+    moved in the meantime are left alone. Updates go out in chunks via a
+    derived table instead of one statement per request.
     """
-    recent_requests = db.execute_query(recent_query)
-    
+    applied = []
+    with db.transaction() as cursor:
+        for start in range(0, len(moves), REBALANCE_CHUNK_SIZE):
+            chunk = moves[start:start + REBALANCE_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"SELECT request_id, hospital_id FROM emergency_requests "
+                f"WHERE request_id IN ({placeholders}) AND status = 'pending' FOR UPDATE",
+                tuple(move['request_id'] for move in chunk)
+            )
+            current = {row['request_id']: row['hospital_id'] for row in cursor.fetchall()}
+            valid = [move for move in chunk if current.get(move['request_id']) == move['from_hospital_id']]
+            if not valid:
+                continue
+
+            rows_sql = ' UNION ALL '.join(
+                ['SELECT %s AS request_id, %s AS hospital_id, %s AS distance, %s AS eta'] * len(valid)
+            )
+            params = []
+            for move in valid:
+                params.extend([move['request_id'], move['to_hospital_id'],
+                               move['distance_to_hospital'], move['estimated_arrival_time']])
+            cursor.execute(
+                f"""
+                UPDATE emergency_requests er
+                JOIN ({rows_sql}) m ON er.request_id = m.request_id
+                SET er.hospital_id = m.hospital_id,
+                    er.distance_to_hospital = m.distance,
+                    er.estimated_arrival_time = m.eta
+                """,
+                tuple(params)
+            )
+            applied.extend(valid)
+    return applied
+
+@api.route('/api/admin/rebalance', methods=['POST'])
+@role_required('superadmin')
+def rebalance_requests():
+    """Plan (and optionally apply) moves of pending requests between hospitals"""
+    data = request.get_json() or {}
+    apply_moves = bool(data.get('apply'))
+
+    try:
+        pending_query = """
+        SELECT request_id, hospital_id, latitude, longitude, priority_level
+        FROM emergency_requests
+        WHERE status = 'pending'
+        """
+        pending = db.execute_query(pending_query) or []
+        load_balancer.refresh()
+        moves = load_balancer.plan_rebalance(pending)
+
+        applied = []
+        if apply_moves and moves:
+            applied = apply_rebalance_moves(moves)
+            for move in applied:
+                scheduling_queues.remove_request(move['from_hospital_id'], move['request_id'])
+                load_balancer.request_moved(move['from_hospital_id'], move['to_hospital_id'])
+            scheduling_queues.add_requests(
+                [(move['to_hospital_id'], move['request_id']) for move in applied]
+            )
+
+            if applied:
+                dashboard_snapshots.mark_changed()
+
+            if applied and 'user_id' in session:
+                log_query = "INSERT INTO system_logs (user_id, action, details) VALUES (%s, %s, %s)"
+                db.execute_query(
+                    log_query,
+                    (session['user_id'], 'REBALANCE_REQUESTS', f'Rerouted {len(applied)} pending requests'),
+                    fetch=False,
+                )
+
+        return jsonify({'moves': moves, 'applied': len(applied)})
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+def bounded_number(value, minimum, maximum, cast=float):
+    """Parse a numeric request field, raising ValueError when out of range"""
+    number = cast(value)
+    if isinstance(value, bool) or not minimum <= number <= maximum:
+        raise ValueError(f'{value!r} is outside {minimum}..{maximum}')
+    return number
+
+@api.route('/api/admin/simulation', methods=['POST'])
+@role_required('superadmin')
+def run_scheduling_simulation():
+    """Compare scheduling algorithms offline on historical or synthetic load."""
+    # Imported here: only superadmins use it and it pulls in multiprocessing
+    from simulation import (
+        SIMULATION_ALGORITHMS,
+        MAX_SIMULATED_RESOURCES,
+        MAX_SWEEP_CONFIGS,
+        MAX_SWEEP_REQUESTS,
+        MAX_SWEEP_PROCESSES,
+        generate_synthetic_requests,
+        load_historical_requests,
+        build_sweep_configs,
+        run_sweep,
+    )
+
+    data = request.get_json() or {}
+    hospital_id = data.get('hospital_id')
+    source = data.get('source', 'history')
+
+    if not hospital_id:
+        return jsonify({'error': 'Hospital ID required'}), 400
+    if source not in ('history', 'synthetic'):
+        return jsonify({'error': 'Invalid source'}), 400
+
+    algorithms = data.get('algorithms') or SIMULATION_ALGORITHMS
+    if not isinstance(algorithms, list):
+        return jsonify({'error': 'algorithms must be a list'}), 400
+    for algorithm in algorithms:
+        if algorithm not in ALLOWED_SCHEDULING_ALGORITHMS:
+            return jsonify({'error': f'Invalid algorithm: {algorithm}'}), 400
+
+    try:
+        weights_options = data.get('priority_weights_options')
+        if weights_options is not None:
+            if not isinstance(weights_options, list):
+                raise ValueError('priority_weights_options must be a list of objects')
+            weights_options = [validate_priority_weights(w) for w in weights_options]
+
+        aging_options = data.get('aging_options')
+        if aging_options is not None:
+            if not isinstance(aging_options, list):
+                raise ValueError('aging_options must be a list')
+            aging_options = [
+                None if aging is None else parse_aging_minutes(aging)
+                for aging in aging_options
+            ]
+
+        processes = data.get('processes')
+        if processes is not None:
+            processes = bounded_number(processes, 1, MAX_SWEEP_PROCESSES, int)
+
+        # Without explicit options the priority run uses the hospital's live
+        # settings; checked against the limit here, expanded once those are known
+        config_count = len(build_sweep_configs(algorithms, weights_options, aging_options))
+        if config_count > MAX_SWEEP_CONFIGS:
+            raise ValueError(f'At most {MAX_SWEEP_CONFIGS} configurations per sweep')
+
+        since = data.get('since')
+        if since is not None:
+            if not isinstance(since, str):
+                raise ValueError('since must be an ISO date')
+            since = datetime.fromisoformat(since)
+
+        synthetic = None
+        if source == 'synthetic':
+            priority_mix = data.get('priority_mix')
+            if priority_mix is not None:
+                if not isinstance(priority_mix, dict) or not priority_mix:
+                    raise ValueError('priority_mix must be an object')
+                priority_mix = {
+                    level: bounded_number(share, 0, 1)
+                    for level, share in priority_mix.items()
+                    if level in PRIORITY_LEVELS
+                }
+                if not sum(priority_mix.values()):
+                    raise ValueError('priority_mix has no weight')
+            seed = data.get('seed')
+            if seed is not None and (isinstance(seed, bool) or not isinstance(seed, (int, str))):
+                raise ValueError('seed must be an integer or a string')
+            days = bounded_number(data.get('days', 30), 0, MAX_SWEEP_REQUESTS)
+            arrivals_per_hour = bounded_number(data.get('arrivals_per_hour', 1.0), 0, MAX_SWEEP_REQUESTS)
+            # The sweep replays the workload once per configuration
+            if days * 24 * arrivals_per_hour * config_count > MAX_SWEEP_REQUESTS:
+                raise ValueError(
+                    f'days * 24 * arrivals_per_hour * configurations must not exceed {MAX_SWEEP_REQUESTS}'
+                )
+            synthetic = {
+                'days': days,
+                'arrivals_per_hour': arrivals_per_hour,
+                'priority_mix': priority_mix,
+                'mean_distance_km': bounded_number(data.get('mean_distance_km', 5.0), 0.1, 500),
+                'seed': seed,
+            }
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid simulation parameters: {e}'}), 400
+
+    try:
+        hospital_query = """
+        SELECT total_ambulances, total_doctors, total_rooms
+        FROM hospitals WHERE hospital_id = %s
+        """
+        hospital = db.execute_query(hospital_query, (hospital_id,))
+        if not hospital:
+            return jsonify({'error': 'Hospital not found'}), 404
+
+        try:
+            resources = {
+                resource: bounded_number(
+                    data.get(f'total_{resource}s', hospital[0][f'total_{resource}s']),
+                    0, MAX_SIMULATED_RESOURCES, int,
+                )
+                for resource in ('ambulance', 'doctor', 'room')
+            }
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid simulation parameters: {e}'}), 400
+
+        live_queue = scheduling_queues.get(hospital_id)
+        configs = build_sweep_configs(
+            algorithms,
+            weights_options or [live_queue.weights],
+            aging_options or [live_queue.aging_minutes],
+        )
+
+        if source == 'history':
+            limit = MAX_SWEEP_REQUESTS // len(configs)
+            workload = load_historical_requests(db, hospital_id, since, limit + 1)
+            if len(workload) > limit:
+                return jsonify({
+                    'error': f'History has more than {limit} requests for {len(configs)} '
+                             'configurations; pass a later since or fewer options'
+                }), 400
+        else:
+            workload = generate_synthetic_requests(**synthetic)
+    except Error as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+    results = run_sweep(workload, resources, configs, processes)
+
+    return jsonify({
+        'hospital_id': hospital_id,
+        'source': source,
+        'resources': resources,
+        'request_count': len(workload),
+        'results': results,
+    })
+
+@api.route('/api/health', methods=['GET'])
+def health_check():
+    """Liveness check; answers before caches are warm and reports their state"""
     return jsonify({
-        'statistics': stats[0] if stats else {},
-        'recent_requests': recent_requests
+        'status': 'ok',
+        'ready': startup_state['ready'],
+        'hydrating': startup_state['hydrating'],
+        'error': startup_state['error'],
+        'uptime_seconds': round(time.monotonic() - startup_state['started_at'], 3)
+        if startup_state['started_at'] is not None else None,
     })
 
+def hydrate_caches(services):
+    """Warm the connection pool, caches and in-memory indexes"""
+    state = services.startup_state
+    state['hydrating'] = True
+    try:
+        services.load_balancer.refresh()
+        for hospital_id in list(services.load_balancer.hospitals):
+            services.scheduling_queues.get(hospital_id)
+            services.ambulance_fleet.available_count(hospital_id)
+        services.dashboard_snapshots.get()
+        services.demand_rollups.build()
+        state['ready'] = True
+        state['error'] = None
+    except Exception as e:
+        print("Startup hydration error:", repr(e))
+        state['error'] = str(e)
+    finally:
+        state['hydrating'] = False
+
+def create_app(overrides=None):
+    """Application factory: build a configured app without touching the database"""
+    config = load_config(overrides)
+
+    app = Flask(__name__)
+    app.config.update(config)
+    app.secret_key = config['SECRET_KEY']
+    app.json = JSONProvider(app)
+    if config['PROXY_COUNT']:
+        # Take the client address from X-Forwarded-For set by trusted proxies
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config['PROXY_COUNT'], x_proto=config['PROXY_COUNT'])
+    CORS(app, supports_credentials=True)
+
+    services = AppServices(config)
+    app.extensions['rapidaid'] = services
+    app.register_blueprint(api)
+
+    services.startup_state['started_at'] = time.monotonic()
+    if config['HYDRATE_ON_START']:
+        threading.Thread(
+            target=hydrate_caches, args=(services,), name='startup-hydration', daemon=True
+        ).start()
+
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app = create_app()
+    app.run(debug=app.config['DEBUG'], host=app.config['HOST'], port=app.config['PORT'])
@@ -0,0 +1,58 @@
+"""Time a batch rebalancing pass over a synthetic region.
+
+Run from the backend directory: python benchmarks/bench_rebalance.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_balancer import HospitalLoad, RegionalLoadBalancer
+
+
+def build_region(rng, hospital_count, request_count):
+    hospitals = []
+    for hospital_id in range(1, hospital_count + 1):
+        hospitals.append(HospitalLoad({
+            'hospital_id': hospital_id,
+            'name': f'Hospital {hospital_id}',
+            'latitude': 40.5 + rng.random(),
+            'longitude': -74.5 + rng.random(),
+            'available_ambulances': rng.choice([0, 0, 1, 2, 3, 5]),
+            'available_doctors': 10,
+            'available_rooms': 20,
+            'pending_requests': rng.randint(0, 8),
+            'max_queue_size': 50,
+        }))
+
+    requests = []
+    for request_id in range(1, request_count + 1):
+        requests.append({
+            'request_id': request_id,
+            'hospital_id': rng.randint(1, hospital_count),
+            'latitude': 40.5 + rng.random(),
+            'longitude': -74.5 + rng.random(),
+            'priority_level': rng.choice(['critical', 'high', 'medium', 'low']),
+        })
+    return hospitals, requests
+
+
+def main():
+    rng = random.Random(42)
+    for hospital_count, request_count in ((100, 500), (500, 2000), (1000, 5000)):
+        hospitals, requests = build_region(rng, hospital_count, request_count)
+        balancer = RegionalLoadBalancer(db=None, refresh_seconds=float('inf'))
+        balancer._set_hospitals(hospitals)
+        balancer.loaded_at = time.monotonic()
+
+        start = time.perf_counter()
+        moves = balancer.plan_rebalance(requests)
+        elapsed = time.perf_counter() - start
+        print(f'{hospital_count:5d} hospitals, {request_count:5d} pending: '
+              f'{len(moves):5d} moves in {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare response serialization paths on a 10k-row query result.
+
+Run from the backend directory: python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization
+from serialization import rows_to_records, dumps, http_date, json_default
+
+COLUMNS = ('request_id', 'patient_id', 'hospital_id', 'symptoms', 'priority_level',
+           'status', 'latitude', 'longitude', 'distance_to_hospital',
+           'estimated_arrival_time', 'ambulance_id', 'assigned_at', 'completed_at',
+           'created_at', 'updated_at', 'patient_name', 'phone')
+
+
+def build_rows(count):
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        created = start + timedelta(minutes=i)
+        rows.append((
+            i, i % 500, i % 20, 'Chest pain, difficulty breathing', 'critical',
+            'pending', Decimal('40.71280000'), Decimal('-74.00600000'), Decimal('2.512'),
+            8, None, None, None, created, created, f'Patient {i}', '+1234567890',
+        ))
+    return rows
+
+
+def flask_default(o):
+    # What Flask's DefaultJSONProvider does for these types
+    if isinstance(o, datetime):
+        return http_date(o)
+    if isinstance(o, Decimal):
+        return str(o)
+    raise TypeError
+
+
+def baseline(rows):
+    # Dictionary cursor rows encoded like jsonify()
+    dict_rows = [dict(zip(COLUMNS, row)) for row in rows]
+    return json.dumps(dict_rows, default=flask_default).encode()
+
+
+def fast(rows):
+    return dumps(rows_to_records(COLUMNS, rows))
+
+
+def fast_stdlib(rows):
+    records = rows_to_records(COLUMNS, rows)
+    return json.dumps(records, default=json_default, separators=(',', ':')).encode()
+
+
+def bench(label, fn, rows, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    print(f'{label:40s} {best * 1000:8.1f} ms')
+
+
+def main():
+    rows = build_rows(10000)
+    backend = 'orjson' if serialization.orjson is not None else 'json'
+    print(f'10000 rows, encoder backend: {backend}')
+    bench('dict rows + default encoder', baseline, rows)
+    bench('tuple rows + bulk convert + json', fast_stdlib, rows)
+    bench('tuple rows + bulk convert + fast dumps', fast, rows)
+
+
+if __name__ == '__main__':
+    main()
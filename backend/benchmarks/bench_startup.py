@@ -0,0 +1,51 @@
+"""Measure cold startup: importing app, create_app() and the first health check.
+
+Each measurement runs in a fresh interpreter so nothing is already
+imported or warm. Hydration is disabled, so no database is needed.
+
+Run from the backend directory: python benchmarks/bench_startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+application = module.create_app({'HYDRATE_ON_START': False})
+created = time.perf_counter()
+response = application.test_client().get('/api/health')
+assert response.status_code == 200, response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_health_check': answered - created,
+}))
+"""
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=BACKEND_DIR,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = [measure_once() for _ in range(RUNS)]
+    print(f"{'phase':<20} {'best ms':>10} {'median ms':>10}")
+    for phase in ('import', 'create_app', 'first_health_check'):
+        values = sorted(run[phase] * 1000 for run in runs)
+        print(f"{phase:<20} {values[0]:>10.1f} {values[len(values) // 2]:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Concurrent stress test for ambulance assignment.
+
+Creates a scratch hospital (with an admin user and a patient) in the
+configured database and runs three races against it:
+
+1. Many threads, each with its own AmbulanceFleet like separate workers,
+   claim "any available" ambulance; none may be handed out twice.
+2. The same threads all claim one specific ambulance; exactly one wins.
+3. The full HTTP lifecycle through the app: threads assign ambulances to
+   pending requests (request CAS + Banker's allocation), move them
+   in_transit, try to force busy ambulances back to 'available', and
+   complete requests (which releases the ambulance). A tracker checks that
+   no ambulance is ever held by two active requests, and the database is
+   checked for the same invariant while the race runs and at the end.
+
+Everything created is deleted afterwards.
+
+Run from the backend directory: python benchmarks/stress_ambulance_assign.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, get_services
+from ambulances import AmbulanceFleet
+
+app = create_app({'HYDRATE_ON_START': False, 'DB_POOL_SIZE': 32})
+db = get_services(app).db
+
+FLEET_SIZE = 20
+THREADS = 32
+ATTEMPTS_PER_THREAD = 10
+# Lifecycle race: more pending requests than ambulances
+LIFECYCLE_REQUESTS = 200
+LIFECYCLE_SECONDS = 20
+
+DOUBLE_ASSIGNED_QUERY = """
+SELECT ambulance_id, COUNT(*) AS holders FROM emergency_requests
+WHERE hospital_id = %s AND status IN ('assigned', 'in_progress') AND ambulance_id IS NOT NULL
+GROUP BY ambulance_id HAVING COUNT(*) > 1
+"""
+
+FREE_BUT_HELD_QUERY = """
+SELECT a.ambulance_id FROM ambulances a
+JOIN emergency_requests er ON er.ambulance_id = a.ambulance_id
+WHERE a.hospital_id = %s AND a.status = 'available' AND er.status IN ('assigned', 'in_progress')
+"""
+
+
+def create_scratch_hospital():
+    tag = uuid.uuid4().hex[:8]
+    hospital_id = db.execute_query(
+        """
+        INSERT INTO hospitals (name, address, latitude, longitude,
+                               total_ambulances, available_ambulances,
+                               total_doctors, available_doctors, total_rooms, available_rooms)
+        VALUES (%s, %s, 0, 0, %s, %s, %s, %s, %s, %s)
+        """,
+        (f'Stress test {tag}', 'n/a', FLEET_SIZE, FLEET_SIZE,
+         FLEET_SIZE, FLEET_SIZE, FLEET_SIZE, FLEET_SIZE),
+        fetch=False,
+    )
+    for i in range(FLEET_SIZE):
+        db.execute_query(
+            "INSERT INTO ambulances (hospital_id, vehicle_number) VALUES (%s, %s)",
+            (hospital_id, f'ST-{tag}-{i}'),
+            fetch=False,
+        )
+    user_id = db.execute_query(
+        "INSERT INTO users (username, password_hash, email, role) VALUES (%s, %s, %s, 'hospital_admin')",
+        (f'stress_{tag}', 'n/a', f'stress_{tag}@example.invalid'),
+        fetch=False,
+    )
+    patient_id = db.execute_query(
+        "INSERT INTO patients (name, phone) VALUES (%s, %s)",
+        (f'Stress patient {tag}', f'+0{tag}'),
+        fetch=False,
+    )
+    return hospital_id, user_id, patient_id
+
+
+def drop_scratch_hospital(hospital_id, user_id, patient_id):
+    db.execute_query("DELETE FROM emergency_requests WHERE hospital_id = %s", (hospital_id,), fetch=False)
+    db.execute_query("DELETE FROM hospitals WHERE hospital_id = %s", (hospital_id,), fetch=False)
+    db.execute_query("DELETE FROM patients WHERE patient_id = %s", (patient_id,), fetch=False)
+    db.execute_query("DELETE FROM users WHERE user_id = %s", (user_id,), fetch=False)
+
+
+def run_threads(worker, count=THREADS):
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def race(hospital_id, target=None):
+    claims = []
+    claims_lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def worker():
+        fleet = AmbulanceFleet(db)
+        barrier.wait()
+        for _ in range(ATTEMPTS_PER_THREAD):
+            ambulance_id = fleet.acquire(hospital_id, target)
+            if ambulance_id:
+                with claims_lock:
+                    claims.append(ambulance_id)
+
+    elapsed = run_threads(worker)
+    return claims, elapsed
+
+
+def lifecycle_race(hospital_id, user_id, patient_id):
+    """Assign / dispatch / force-free / complete concurrently through the API."""
+    request_ids = [
+        db.execute_query(
+            """
+            INSERT INTO emergency_requests (patient_id, hospital_id, symptoms, priority_level, latitude, longitude)
+            VALUES (%s, %s, 'stress test', %s, 0, 0)
+            """,
+            (patient_id, hospital_id, random.choice(['critical', 'high', 'medium', 'low'])),
+            fetch=False,
+        )
+        for _ in range(LIFECYCLE_REQUESTS)
+    ]
+
+    # ambulance_id -> request_id for every assignment the API reported
+    holders = {}
+    active = []
+    state_lock = threading.Lock()
+    violations = []
+    counts = Counter()
+    deadline = time.monotonic() + LIFECYCLE_SECONDS
+    stop = threading.Event()
+
+    def client():
+        c = app.test_client()
+        with c.session_transaction() as session:
+            session['user_id'] = user_id
+        return c
+
+    def worker():
+        c = client()
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            action = rng.random()
+            if action < 0.5:
+                request_id = rng.choice(request_ids)
+                response = c.post(f'/api/emergency_requests/{request_id}/assign', json={})
+                if response.status_code == 200:
+                    ambulance_id = response.get_json()['ambulance_id']
+                    with state_lock:
+                        if ambulance_id in holders:
+                            violations.append(
+                                f'ambulance {ambulance_id} given to request {request_id} '
+                                f'while held by request {holders[ambulance_id]}'
+                            )
+                        holders[ambulance_id] = request_id
+                        active.append((request_id, ambulance_id))
+                        counts['assigned'] += 1
+                continue
+
+            with state_lock:
+                if not active:
+                    continue
+                request_id, ambulance_id = active[rng.randrange(len(active))]
+
+            if action < 0.65:
+                c.post(f'/api/ambulances/{ambulance_id}/status', json={'status': 'in_transit'})
+            elif action < 0.8:
+                # Must be refused while the request is active
+                response = c.post(f'/api/ambulances/{ambulance_id}/status', json={'status': 'available'})
+                with state_lock:
+                    if response.status_code == 200 and holders.get(ambulance_id) == request_id:
+                        violations.append(f'ambulance {ambulance_id} freed while request {request_id} active')
+                    counts['force_free_refused' if response.status_code != 200 else 'force_free_ok'] += 1
+            else:
+                # Stop tracking before the ambulance can be freed and reclaimed
+                with state_lock:
+                    if (request_id, ambulance_id) not in active:
+                        continue
+                    active.remove((request_id, ambulance_id))
+                    del holders[ambulance_id]
+                    counts['completed'] += 1
+                response = c.post(f'/api/emergency_requests/{request_id}/complete')
+                if response.status_code != 200:
+                    violations.append(f'completing request {request_id} failed: {response.status_code}')
+
+    def monitor():
+        while not stop.wait(0.2):
+            doubles = db.execute_query(DOUBLE_ASSIGNED_QUERY, (hospital_id,))
+            free_but_held = db.execute_query(FREE_BUT_HELD_QUERY, (hospital_id,))
+            for row in doubles or []:
+                violations.append(f"database: ambulance {row['ambulance_id']} held by {row['holders']} requests")
+            for row in free_but_held or []:
+                violations.append(f"database: ambulance {row['ambulance_id']} available while held")
+
+    watcher = threading.Thread(target=monitor)
+    watcher.start()
+    try:
+        elapsed = run_threads(worker)
+    finally:
+        stop.set()
+        watcher.join()
+
+    # Drain: complete whatever is still active, then every resource must be back
+    c = client()
+    for request_id, _ in list(active):
+        c.post(f'/api/emergency_requests/{request_id}/complete')
+    hospital = db.execute_query(
+        "SELECT available_ambulances, available_doctors, available_rooms FROM hospitals WHERE hospital_id = %s",
+        (hospital_id,)
+    )[0]
+    free = db.execute_query(
+        "SELECT COUNT(*) AS free FROM ambulances WHERE hospital_id = %s AND status = 'available'",
+        (hospital_id,)
+    )[0]['free']
+    if free != FLEET_SIZE:
+        violations.append(f'{FLEET_SIZE - free} ambulances not returned after all requests completed')
+    for column, value in hospital.items():
+        if value != FLEET_SIZE:
+            violations.append(f'{column} is {value} after all requests completed, expected {FLEET_SIZE}')
+    return counts, violations, elapsed
+
+
+def main():
+    hospital_id, user_id, patient_id = create_scratch_hospital()
+    failures = 0
+    try:
+        claims, elapsed = race(hospital_id)
+        doubles = [a for a, n in Counter(claims).items() if n > 1]
+        print(f'any-available: {len(claims)} claims for {FLEET_SIZE} ambulances, '
+              f'{len(doubles)} double assignments, {elapsed:.2f}s')
+        if doubles or len(claims) != FLEET_SIZE:
+            failures += 1
+
+        db.execute_query(
+            "UPDATE ambulances SET status = 'available' WHERE hospital_id = %s",
+            (hospital_id,), fetch=False,
+        )
+        target = db.execute_query(
+            "SELECT ambulance_id FROM ambulances WHERE hospital_id = %s LIMIT 1", (hospital_id,)
+        )[0]['ambulance_id']
+        claims, elapsed = race(hospital_id, target)
+        print(f'same ambulance: {len(claims)} winners out of {THREADS * ATTEMPTS_PER_THREAD} attempts, '
+              f'{elapsed:.2f}s')
+        if len(claims) != 1:
+            failures += 1
+
+        db.execute_query(
+            "UPDATE ambulances SET status = 'available' WHERE hospital_id = %s",
+            (hospital_id,), fetch=False,
+        )
+        counts, violations, elapsed = lifecycle_race(hospital_id, user_id, patient_id)
+        print(f"lifecycle: {counts['assigned']} assignments, {counts['completed']} completions, "
+              f"{counts['force_free_refused']} forced frees refused, "
+              f"{len(violations)} violations, {elapsed:.2f}s")
+        for violation in violations[:20]:
+            print('  ', violation)
+        if violations:
+            failures += 1
+    finally:
+        drop_scratch_hospital(hospital_id, user_id, patient_id)
+
+    print('PASS' if not failures else 'FAIL')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
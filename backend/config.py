@@ -0,0 +1,52 @@
+"""Environment-driven configuration for the RapidAid API.
+
+Every setting can be overridden with a RAPIDAID_* environment variable
+(or a .env file next to the backend); create_app() also accepts a dict of
+overrides, which is what tests and one-off scripts use.
+"""
+import os
+
+from dotenv import load_dotenv
+
+
+def _env(name, default=None):
+    return os.environ.get(f'RAPIDAID_{name}', default)
+
+
+def _env_bool(name, default):
+    value = _env(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def load_config(overrides=None):
+    """Build the Flask config mapping from the environment plus overrides."""
+    load_dotenv()
+
+    secret_key = _env('SECRET_KEY')
+    config = {
+        # Without a fixed key sessions do not survive restarts or span workers
+        'SECRET_KEY': secret_key.encode() if secret_key else os.urandom(24),
+        'DB_CONFIG': {
+            'host': _env('DB_HOST', 'localhost'),
+            'port': int(_env('DB_PORT', 3306)),
+            'user': _env('DB_USER', 'root'),
+            'password': _env('DB_PASSWORD', 'root'),
+            'database': _env('DB_NAME', 'rapidaid'),
+        },
+        # 0 disables pooling and opens a fresh connection per query
+        'DB_POOL_SIZE': int(_env('DB_POOL_SIZE', 10)),
+        # Warm caches and in-memory indexes in a background thread at startup
+        'HYDRATE_ON_START': _env_bool('HYDRATE_ON_START', True),
+        # Number of reverse proxies in front of the app whose X-Forwarded-For
+        # is trusted; 0 uses the socket address as the client
+        'PROXY_COUNT': int(_env('PROXY_COUNT', 0)),
+        # Flask debug mode; set RAPIDAID_DEBUG=1 for local development only
+        'DEBUG': _env_bool('DEBUG', False),
+        'HOST': _env('HOST', '0.0.0.0'),
+        'PORT': int(_env('PORT', 5000)),
+    }
+    if overrides:
+        config.update(overrides)
+    return config
@@ -0,0 +1,189 @@
+"""Precomputed admin dashboard snapshots.
+
+The full system view is computed in one read-only transaction, encoded
+once and kept as an immutable snapshot. A background thread rebuilds it
+on a fixed interval or shortly after a change event, so serving the
+dashboard costs the same no matter how many admins are watching.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from serialization import dumps, rows_to_records
+
+# Rebuild at least this often even without change events
+DASHBOARD_REFRESH_SECONDS = 30
+# Coalesce bursts of change events into one rebuild
+DASHBOARD_MIN_REBUILD_SECONDS = 1
+RECENT_REQUESTS_LIMIT = 10
+
+REQUEST_STATUSES = ['pending', 'assigned', 'in_progress', 'completed', 'cancelled']
+PRIORITY_LEVELS = ['critical', 'high', 'medium', 'low']
+
+# body is the pre-encoded JSON document served to every admin
+DashboardSnapshot = namedtuple('DashboardSnapshot', ['version', 'generated_at', 'body'])
+
+
+class DashboardSnapshotService:
+    # Requests are aggregated per hospital before the join, so hospital
+    # totals are not multiplied by the number of requests.
+    HOSPITALS_QUERY = """
+    SELECT h.hospital_id, h.name,
+           h.total_ambulances, h.available_ambulances,
+           h.total_doctors, h.available_doctors,
+           h.total_rooms, h.available_rooms,
+           hs.algorithm as scheduling_algorithm,
+           COALESCE(r.pending, 0) as pending_requests,
+           COALESCE(r.assigned, 0) as assigned_requests,
+           COALESCE(r.in_progress, 0) as in_progress_requests,
+           COALESCE(r.completed, 0) as completed_requests,
+           COALESCE(r.cancelled, 0) as cancelled_requests,
+           COALESCE(r.critical, 0) as critical_requests,
+           COALESCE(r.high, 0) as high_requests,
+           COALESCE(r.medium, 0) as medium_requests,
+           COALESCE(r.low, 0) as low_requests
+    FROM hospitals h
+    LEFT JOIN hospital_scheduling hs ON h.hospital_id = hs.hospital_id
+    LEFT JOIN (
+        SELECT hospital_id,
+               COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
+               COUNT(CASE WHEN status = 'assigned' THEN 1 END) as assigned,
+               COUNT(CASE WHEN status = 'in_progress' THEN 1 END) as in_progress,
+               COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
+               COUNT(CASE WHEN status = 'cancelled' THEN 1 END) as cancelled,
+               COUNT(CASE WHEN priority_level = 'critical' THEN 1 END) as critical,
+               COUNT(CASE WHEN priority_level = 'high' THEN 1 END) as high,
+               COUNT(CASE WHEN priority_level = 'medium' THEN 1 END) as medium,
+               COUNT(CASE WHEN priority_level = 'low' THEN 1 END) as low
+        FROM emergency_requests
+        GROUP BY hospital_id
+    ) r ON h.hospital_id = r.hospital_id
+    ORDER BY h.name
+    """
+
+    RECENT_QUERY = """
+    SELECT er.*, p.name as patient_name, h.name as hospital_name
+    FROM emergency_requests er
+    JOIN patients p ON er.patient_id = p.patient_id
+    LEFT JOIN hospitals h ON er.hospital_id = h.hospital_id
+    ORDER BY er.created_at DESC
+    LIMIT %s
+    """
+
+    def __init__(self, db, refresh_seconds=DASHBOARD_REFRESH_SECONDS,
+                 min_rebuild_seconds=DASHBOARD_MIN_REBUILD_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.min_rebuild_seconds = min_rebuild_seconds
+        self.snapshot = None
+        self.version = 0
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.changed = threading.Event()
+        self.thread = None
+
+    def _query(self):
+        """Run both dashboard queries against one consistent read view."""
+        conn = self.db.get_connection()
+        cursor = None
+        try:
+            conn.start_transaction(consistent_snapshot=True, readonly=True)
+            cursor = conn.cursor()
+            cursor.execute(self.HOSPITALS_QUERY)
+            hospitals = rows_to_records(cursor.column_names, cursor.fetchall())
+            cursor.execute(self.RECENT_QUERY, (RECENT_REQUESTS_LIMIT,))
+            recent = rows_to_records(cursor.column_names, cursor.fetchall())
+            conn.commit()
+            return hospitals, recent
+        finally:
+            try:
+                if cursor:
+                    cursor.close()
+            except:
+                pass
+            try:
+                conn.close()
+            except:
+                pass
+
+    def rebuild(self):
+        """Compute a new snapshot and publish it atomically."""
+        with self.rebuild_lock:
+            return self._rebuild()
+
+    def _rebuild(self):
+        hospitals, recent = self._query()
+
+        by_status = {status: 0 for status in REQUEST_STATUSES}
+        by_priority = {level: 0 for level in PRIORITY_LEVELS}
+        totals = {
+            'total_ambulances': 0, 'available_ambulances': 0,
+            'total_doctors': 0, 'available_doctors': 0,
+            'total_rooms': 0, 'available_rooms': 0,
+        }
+        for hospital in hospitals:
+            for status in REQUEST_STATUSES:
+                by_status[status] += int(hospital[f'{status}_requests'])
+            for level in PRIORITY_LEVELS:
+                by_priority[level] += int(hospital[f'{level}_requests'])
+            for key in totals:
+                totals[key] += hospital[key] or 0
+
+        statistics = dict(
+            totals,
+            total_hospitals=len(hospitals),
+            pending_requests=by_status['pending'],
+            active_requests=by_status['in_progress'],
+            completed_requests=by_status['completed'],
+            requests_by_status=by_status,
+            requests_by_priority=by_priority,
+        )
+
+        with self.lock:
+            self.version += 1
+            generated_at = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+            data = {
+                'version': self.version,
+                'generated_at': generated_at,
+                'statistics': statistics,
+                'hospitals': hospitals,
+                'recent_requests': recent,
+            }
+            self.snapshot = DashboardSnapshot(self.version, generated_at, dumps(data))
+            return self.snapshot
+
+    def get(self):
+        """Latest snapshot; built synchronously only the very first time."""
+        self.start()
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.rebuild_lock:
+                # Concurrent cold-start callers reuse the first caller's build
+                snapshot = self.snapshot
+                if snapshot is None:
+                    snapshot = self._rebuild()
+        return snapshot
+
+    def mark_changed(self):
+        """Signal that underlying data changed and a rebuild is due."""
+        self.changed.set()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name='dashboard-snapshot', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.changed.wait(self.refresh_seconds)
+            self.changed.clear()
+            try:
+                self.rebuild()
+            except Exception as e:
+                print("Dashboard snapshot error:", repr(e))
+            time.sleep(self.min_rebuild_seconds)
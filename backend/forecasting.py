@@ -0,0 +1,232 @@
+"""Demand rollups and surge forecasting from emergency_requests history.
+
+Arrivals are rolled up per hospital into one compact array per day
+(24 hours x 4 priority levels). Rollups are built incrementally by
+streaming new rows in request_id order in fixed-size chunks, so memory
+stays bounded by the retained history rather than by the table size.
+
+Forecasts use a seasonal hour-of-week profile: each past week's counts
+are blended with exponentially decaying weights, then scaled by the
+recent trend. Recommended staffing covers the predicted peak hour with a
+Poisson safety margin.
+"""
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from load_balancer import AVERAGE_SERVICE_MINUTES
+
+PRIORITY_LEVELS = ['critical', 'high', 'medium', 'low']
+PRIORITY_INDEX = {level: index for index, level in enumerate(PRIORITY_LEVELS)}
+LEVELS = len(PRIORITY_LEVELS)
+HOURS_PER_WEEK = 7 * 24
+SLOTS_PER_DAY = 24 * LEVELS
+SLOTS_PER_WEEK = HOURS_PER_WEEK * LEVELS
+
+HISTORY_DAYS = 8 * 7
+ROLLUP_CHUNK_SIZE = 10000
+ROLLUP_REFRESH_SECONDS = 5 * 60
+
+# Weight of the most recent week; older weeks decay by (1 - alpha) each
+SEASONAL_ALPHA = 0.4
+TREND_LIMITS = (0.5, 2.0)
+
+# How long each resource is tied up by one request, in minutes
+AMBULANCE_SERVICE_MINUTES = AVERAGE_SERVICE_MINUTES
+DOCTOR_SERVICE_MINUTES = 60
+ROOM_STAY_MINUTES = 4 * 60
+# Staff for the predicted peak with this probability of not running out
+STAFFING_SERVICE_LEVEL = 0.95
+
+
+class DemandRollups:
+    """Per-hospital daily arrival counts, indexed by hour and priority."""
+
+    CHUNK_QUERY = """
+    SELECT request_id, hospital_id, priority_level, created_at
+    FROM emergency_requests
+    WHERE request_id > %s AND created_at >= %s
+    ORDER BY request_id
+    LIMIT %s
+    """
+
+    def __init__(self, db, history_days=HISTORY_DAYS, chunk_size=ROLLUP_CHUNK_SIZE):
+        self.db = db
+        self.history_days = history_days
+        self.chunk_size = chunk_size
+        # hospital_id -> {date ordinal -> array of SLOTS_PER_DAY counts}
+        self.days = {}
+        # hospital_id -> ordinal of the first day with any request; days
+        # before it are missing history, not zero demand
+        self.first_day = {}
+        self.last_request_id = 0
+        self.built_at = 0
+        self.lock = threading.Lock()
+
+    def build(self, now=None):
+        """Fold every request newer than the last one seen into the rollups."""
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.history_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        with self.lock:
+            processed = 0
+            while True:
+                rows = self.db.execute_query(
+                    self.CHUNK_QUERY, (self.last_request_id, cutoff, self.chunk_size)
+                ) or []
+                for row in rows:
+                    level = PRIORITY_INDEX.get(row['priority_level'])
+                    if row['hospital_id'] is not None and level is not None:
+                        created = row['created_at']
+                        ordinal = created.toordinal()
+                        hospital_days = self.days.setdefault(row['hospital_id'], {})
+                        day = hospital_days.get(ordinal)
+                        if day is None:
+                            day = hospital_days[ordinal] = array('I', bytes(4 * SLOTS_PER_DAY))
+                            first = self.first_day.get(row['hospital_id'])
+                            if first is None or ordinal < first:
+                                self.first_day[row['hospital_id']] = ordinal
+                        day[created.hour * LEVELS + level] += 1
+                    self.last_request_id = row['request_id']
+                processed += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+
+            oldest = cutoff.toordinal()
+            for hospital_days in self.days.values():
+                for ordinal in [o for o in hospital_days if o < oldest]:
+                    del hospital_days[ordinal]
+
+            self.built_at = time.monotonic()
+            return processed
+
+    def ensure_fresh(self, max_age=ROLLUP_REFRESH_SECONDS):
+        if time.monotonic() - self.built_at > max_age:
+            self.build()
+
+    def day(self, hospital_id, ordinal):
+        return self.days.get(hospital_id, {}).get(ordinal)
+
+    def history_start(self, hospital_id):
+        """First day ordinal with observed history, or None."""
+        return self.first_day.get(hospital_id)
+
+
+def _poisson_quantile(mean, probability):
+    """Smallest k with P(X <= k) >= probability for X ~ Poisson(mean)."""
+    if mean <= 0:
+        return 0
+    term = math.exp(-mean)
+    if term == 0.0:
+        # Normal approximation for large means
+        return int(math.ceil(mean + 1.645 * math.sqrt(mean)))
+    cumulative = term
+    k = 0
+    while cumulative < probability:
+        k += 1
+        term *= mean / k
+        cumulative += term
+    return k
+
+
+class SurgeForecaster:
+    def __init__(self, rollups, alpha=SEASONAL_ALPHA):
+        self.rollups = rollups
+        self.alpha = alpha
+
+    def seasonal_profile(self, hospital_id, today):
+        """Expected arrivals per (hour-of-week, priority) slot plus trend factor.
+
+        Only complete days are used: week 0 is the seven days ending
+        yesterday, week 1 the seven before that, and so on. Weeks reaching
+        back before the hospital's first observed day are left out rather
+        than counted as zero demand; the first observed day itself is
+        usually partial, so it is skipped too. With less than a full week
+        of history the covered days are averaged into one daily profile.
+        """
+        profile = [0.0] * SLOTS_PER_WEEK
+        first_day = self.rollups.history_start(hospital_id)
+        last_day = today.toordinal() - 1
+        if first_day is None or first_day + 1 > last_day:
+            return profile, 1.0
+        start = first_day + 1
+
+        available_weeks = (last_day - start + 1) // 7
+        weeks = min(self.rollups.history_days // 7, available_weeks)
+        if not weeks:
+            daily = [0.0] * SLOTS_PER_DAY
+            covered = last_day - start + 1
+            for ordinal in range(start, last_day + 1):
+                counts = self.rollups.day(hospital_id, ordinal)
+                if counts is not None:
+                    daily = [d + c for d, c in zip(daily, counts)]
+            daily = [d / covered for d in daily]
+            return daily * 7, 1.0
+
+        weekly_totals = []
+        total_weight = 0.0
+        for week in range(weeks):
+            weekly = [0] * SLOTS_PER_WEEK
+            for offset in range(7):
+                ordinal = last_day - week * 7 - offset
+                counts = self.rollups.day(hospital_id, ordinal)
+                if counts is None:
+                    continue
+                base = datetime.fromordinal(ordinal).weekday() * SLOTS_PER_DAY
+                weekly[base:base + SLOTS_PER_DAY] = counts
+            weight = self.alpha * (1 - self.alpha) ** week
+            profile = [p + weight * w for p, w in zip(profile, weekly)]
+            total_weight += weight
+            weekly_totals.append(sum(weekly))
+
+        profile = [p / total_weight for p in profile]
+
+        trend = 1.0
+        earlier = weekly_totals[1:]
+        if earlier and sum(earlier):
+            baseline = sum(earlier) / len(earlier)
+            trend = min(max(weekly_totals[0] / baseline, TREND_LIMITS[0]), TREND_LIMITS[1])
+        return profile, trend
+
+    def forecast(self, hospital_id, hours=24, now=None):
+        """Hourly predicted arrivals by priority for the next `hours` hours."""
+        now = now or datetime.now()
+        self.rollups.ensure_fresh()
+        profile, trend = self.seasonal_profile(hospital_id, now.date())
+
+        start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        hourly = []
+        for step in range(hours):
+            moment = start + timedelta(hours=step)
+            slot = (moment.weekday() * 24 + moment.hour) * LEVELS
+            by_priority = {
+                level: round(profile[slot + index] * trend, 3)
+                for index, level in enumerate(PRIORITY_LEVELS)
+            }
+            hourly.append({
+                'hour': moment.strftime('%Y-%m-%dT%H:00'),
+                'expected_requests': round(sum(by_priority.values()), 3),
+                'by_priority': by_priority,
+            })
+        return hourly, trend
+
+    def recommend_staffing(self, hourly):
+        """Resources needed to cover the busiest forecast hour."""
+        if not hourly:
+            return {'ambulances': 0, 'doctors': 0, 'rooms': 0, 'peak_hour': None}
+
+        peak = max(hourly, key=lambda h: h['expected_requests'])
+        arrivals = peak['expected_requests']
+        # Critical/high requests also take a room (see assign_ambulance)
+        room_arrivals = peak['by_priority']['critical'] + peak['by_priority']['high']
+
+        # Little's law: requests in service = arrival rate x time in service
+        return {
+            'peak_hour': peak['hour'],
+            'peak_expected_requests': arrivals,
+            'ambulances': _poisson_quantile(arrivals * AMBULANCE_SERVICE_MINUTES / 60.0, STAFFING_SERVICE_LEVEL),
+            'doctors': _poisson_quantile(arrivals * DOCTOR_SERVICE_MINUTES / 60.0, STAFFING_SERVICE_LEVEL),
+            'rooms': _poisson_quantile(room_arrivals * ROOM_STAY_MINUTES / 60.0, STAFFING_SERVICE_LEVEL),
+        }
@@ -0,0 +1,166 @@
+"""Ingress protection for unauthenticated patient endpoints.
+
+Emergency submission and request-history polling need no login, so a
+panicking user or a buggy client can hammer them. This module holds the
+in-memory pieces used to keep that traffic bounded: token-bucket rate
+limiting, a TTL cache for idempotent replays and duplicate submissions,
+and single-flight coalescing of identical concurrent calls.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Emergency submissions per phone: a short burst, then one every 20 seconds.
+# There is deliberately no per-IP submission limit: behind a proxy or
+# carrier NAT many patients share one address, and emergency intake must
+# not be throttled for all of them together.
+SUBMIT_RATE_PER_SECOND = 1 / 20.0
+SUBMIT_BURST = 3
+# History polls per phone: a couple per second is plenty for a status page
+POLL_RATE_PER_SECOND = 2.0
+POLL_BURST = 10
+# History polls per client address, sized for many patients behind one NAT
+POLL_IP_RATE_PER_SECOND = 50.0
+POLL_IP_BURST = 200
+
+# Same phone + hospital inside this window is treated as the same emergency
+DUPLICATE_WINDOW_SECONDS = 10 * 60
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+# Identical history polls share one result for this long
+POLL_RESULT_TTL_SECONDS = 2
+
+MAX_TRACKED_KEYS = 100000
+
+
+def normalize_phone(raw):
+    """Phone number as used for lookups and as the rate limit / cache key."""
+    return str(raw).strip()
+
+
+def request_fingerprint(data, ignore=('idempotency_key',)):
+    """Stable digest of a JSON body, to tell a retry from a different request."""
+    body = {key: value for key, value in data.items() if key not in ignore}
+    encoded = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets, refilled lazily on each check."""
+
+    def __init__(self, rate, burst, max_keys=MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        """Take `cost` tokens; returns (allowed, seconds until allowed)."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            # Least recently seen keys go first; a full bucket is no loss
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, (cost - tokens) / self.rate
+
+
+class TTLCache:
+    """Small bounded cache whose entries expire after a fixed time."""
+
+    def __init__(self, ttl, max_entries=MAX_TRACKED_KEYS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < now:
+                del self.entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, expires)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Single-flight: concurrent calls with the same key share one execution.
+
+    With `ttl` set, a finished result is also reused by calls arriving
+    shortly afterwards.
+    """
+
+    def __init__(self, ttl=0):
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.results = TTLCache(ttl) if ttl else None
+
+    def run(self, key, fn):
+        if self.results is not None:
+            cached = self.results.get(key)
+            if cached is not None:
+                return cached
+
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.inflight[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            if self.results is not None and call.result is not None:
+                self.results.set(key, call.result)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            call.done.set()
+
+    def forget(self, key):
+        if self.results is not None:
+            self.results.delete(key)
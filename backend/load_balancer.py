@@ -0,0 +1,350 @@
+"""Regional load balancing across hospitals.
+
+Keeps an in-memory view of every hospital's free resources and pending
+queue depth, scores hospitals for a patient location by expected response
+time, and computes batch reroutes of pending requests away from
+overloaded hospitals.
+"""
+import bisect
+import math
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.0
+
+# Same travel estimate as create_emergency_request: 3 minutes per km
+MINUTES_PER_KM = 3
+# Average time an ambulance is tied up by one request
+AVERAGE_SERVICE_MINUTES = 45
+# Extra wait when a hospital has no free ambulance at all
+NO_AMBULANCE_PENALTY_MINUTES = 60
+# Only move a request when it saves at least this much
+REROUTE_THRESHOLD_MINUTES = 10
+# Never consider hospitals further away than this
+MAX_REROUTE_KM = 50
+# Spatial grid cells hold about this many hospitals on average
+GRID_HOSPITALS_PER_CELL = 2
+
+LOAD_REFRESH_SECONDS = 30
+
+
+class HospitalLoad:
+    __slots__ = ('hospital_id', 'name', 'latitude', 'longitude', 'lat_rad', 'lon_rad',
+                 'cos_lat', 'available_ambulances', 'available_doctors',
+                 'available_rooms', 'queue_depth', 'max_queue_size')
+
+    def __init__(self, row):
+        self.hospital_id = row['hospital_id']
+        self.name = row['name']
+        self.latitude = float(row['latitude'])
+        self.longitude = float(row['longitude'])
+        self.lat_rad = math.radians(self.latitude)
+        self.lon_rad = math.radians(self.longitude)
+        self.cos_lat = math.cos(self.lat_rad)
+        self.available_ambulances = row['available_ambulances'] or 0
+        self.available_doctors = row['available_doctors'] or 0
+        self.available_rooms = row['available_rooms'] or 0
+        self.queue_depth = int(row.get('pending_requests') or 0)
+        self.max_queue_size = row.get('max_queue_size')
+
+    def has_queue_room(self):
+        return self.max_queue_size is None or self.queue_depth < self.max_queue_size
+
+    def expected_wait(self):
+        """Minutes until a new request would get an ambulance here."""
+        if self.available_ambulances <= 0:
+            return NO_AMBULANCE_PENALTY_MINUTES + self.queue_depth * AVERAGE_SERVICE_MINUTES
+        # Requests already queued take the free ambulances first
+        waves = self.queue_depth // self.available_ambulances
+        return waves * AVERAGE_SERVICE_MINUTES
+
+    def to_dict(self):
+        return {
+            'hospital_id': self.hospital_id,
+            'name': self.name,
+            'available_ambulances': self.available_ambulances,
+            'available_doctors': self.available_doctors,
+            'available_rooms': self.available_rooms,
+            'queue_depth': self.queue_depth,
+        }
+
+
+class _SpatialGrid:
+    """Uniform lat/lon grid over hospitals for nearest-neighbour searches."""
+
+    def __init__(self, loads):
+        loads = list(loads)
+        self.cell_degrees = 0.05
+        if len(loads) > 1:
+            lat_span = max(l.latitude for l in loads) - min(l.latitude for l in loads)
+            lon_span = max(l.longitude for l in loads) - min(l.longitude for l in loads)
+            area = max(lat_span * lon_span, 1e-6)
+            self.cell_degrees = min(max(math.sqrt(area * GRID_HOSPITALS_PER_CELL / len(loads)), 0.01), 1.0)
+        self.cells = {}
+        for load in loads:
+            self.cells.setdefault(self.cell(load.latitude, load.longitude), []).append(load)
+
+    def cell(self, latitude, longitude):
+        return (int(math.floor(latitude / self.cell_degrees)),
+                int(math.floor(longitude / self.cell_degrees)))
+
+    def remove(self, load):
+        cell = self.cells.get(self.cell(load.latitude, load.longitude))
+        if cell and load in cell:
+            cell.remove(load)
+
+    def ring(self, center, radius):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for dc in range(-radius, radius + 1):
+            yield (row - radius, col + dc)
+            yield (row + radius, col + dc)
+        for dr in range(-radius + 1, radius):
+            yield (row + dr, col - radius)
+            yield (row + dr, col + radius)
+
+
+def _distance_km(lat_rad, lon_rad, cos_lat, hospital):
+    """Haversine distance using precomputed radians and cosines."""
+    dlat = hospital.lat_rad - lat_rad
+    dlon = hospital.lon_rad - lon_rad
+    a = math.sin(dlat / 2) ** 2 + cos_lat * hospital.cos_lat * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RegionalLoadBalancer:
+    LOAD_QUERY = """
+    SELECT h.hospital_id, h.name, h.latitude, h.longitude,
+           h.available_ambulances, h.available_doctors, h.available_rooms,
+           hs.max_queue_size,
+           (SELECT COUNT(*) FROM emergency_requests er
+            WHERE er.hospital_id = h.hospital_id AND er.status = 'pending') as pending_requests
+    FROM hospitals h
+    LEFT JOIN hospital_scheduling hs ON h.hospital_id = hs.hospital_id
+    """
+
+    def __init__(self, db, refresh_seconds=LOAD_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.RLock()
+        self.hospitals = {}
+        self.by_latitude = []
+        self.latitudes = []
+        self.loaded_at = 0
+
+    # State tracking
+    def refresh(self):
+        rows = self.db.execute_query(self.LOAD_QUERY) or []
+        with self.lock:
+            self._set_hospitals([HospitalLoad(row) for row in rows])
+            self.loaded_at = time.monotonic()
+
+    def _set_hospitals(self, loads):
+        self.hospitals = {load.hospital_id: load for load in loads}
+        self.by_latitude = sorted(loads, key=lambda load: load.latitude)
+        self.latitudes = [load.latitude for load in self.by_latitude]
+
+    def _ensure_fresh(self):
+        if time.monotonic() - self.loaded_at > self.refresh_seconds:
+            self.refresh()
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = 0
+
+    def _adjust(self, hospital_id, queue_delta=0, ambulance_delta=0):
+        with self.lock:
+            load = self.hospitals.get(hospital_id)
+            if load is not None:
+                load.queue_depth = max(load.queue_depth + queue_delta, 0)
+                load.available_ambulances = max(load.available_ambulances + ambulance_delta, 0)
+
+    def request_created(self, hospital_id):
+        self._adjust(hospital_id, queue_delta=1)
+
+    def request_assigned(self, hospital_id):
+        self._adjust(hospital_id, queue_delta=-1, ambulance_delta=-1)
+
+    def request_completed(self, hospital_id):
+        self._adjust(hospital_id, ambulance_delta=1)
+
+    def request_moved(self, from_hospital_id, to_hospital_id):
+        self._adjust(from_hospital_id, queue_delta=-1)
+        self._adjust(to_hospital_id, queue_delta=1)
+
+    # Scoring
+    def _candidates(self, latitude, max_km):
+        if max_km is None:
+            return self.by_latitude
+        delta = max_km / KM_PER_DEGREE_LAT
+        lo = bisect.bisect_left(self.latitudes, latitude - delta)
+        hi = bisect.bisect_right(self.latitudes, latitude + delta)
+        return self.by_latitude[lo:hi]
+
+    def _score_all(self, latitude, longitude, max_km=MAX_REROUTE_KM, queue_extra=None):
+        lat_rad = math.radians(latitude)
+        lon_rad = math.radians(longitude)
+        cos_lat = math.cos(lat_rad)
+        scored = []
+        for load in self._candidates(latitude, max_km):
+            distance = _distance_km(lat_rad, lon_rad, cos_lat, load)
+            if max_km is not None and distance > max_km:
+                continue
+            wait = load.expected_wait()
+            if queue_extra:
+                extra = queue_extra.get(load.hospital_id, 0)
+                if extra:
+                    wait += extra * AVERAGE_SERVICE_MINUTES / max(load.available_ambulances, 1)
+            scored.append((distance * MINUTES_PER_KM + wait, distance, load))
+        scored.sort(key=lambda item: item[0])
+        return scored
+
+    def recommend(self, latitude, longitude, limit=5, max_km=MAX_REROUTE_KM):
+        """Hospitals ordered by expected response time for a location."""
+        self._ensure_fresh()
+        latitude, longitude = float(latitude), float(longitude)
+        with self.lock:
+            scored = self._score_all(latitude, longitude, max_km)
+        return [
+            dict(load.to_dict(),
+                 distance_km=round(distance, 3),
+                 expected_response_minutes=round(score, 1))
+            for score, distance, load in scored
+            if load.has_queue_room()
+        ][:limit]
+
+    def best_alternative(self, latitude, longitude, hospital_id,
+                         min_saving=REROUTE_THRESHOLD_MINUTES, max_km=MAX_REROUTE_KM):
+        """Best hospital other than `hospital_id` that has room in its queue.
+
+        Returns (hospital, minutes_saved). With `min_saving` set, the
+        alternative must beat `hospital_id` by at least that many minutes;
+        with None any alternative is accepted (used for overflow). With
+        `max_km` None every hospital is considered, however far.
+        """
+        self._ensure_fresh()
+        latitude, longitude = float(latitude), float(longitude)
+        with self.lock:
+            scored = self._score_all(latitude, longitude, max_km)
+            current = None
+            for score, _, load in scored:
+                if load.hospital_id == hospital_id:
+                    current = score
+                    break
+            for score, distance, load in scored:
+                if load.hospital_id == hospital_id or not load.has_queue_room():
+                    continue
+                saved = (current - score) if current is not None else 0
+                if min_saving is not None and (current is None or saved < min_saving):
+                    return None, 0
+                return {
+                    'hospital_id': load.hospital_id,
+                    'name': load.name,
+                    'latitude': load.latitude,
+                    'longitude': load.longitude,
+                    'distance_km': round(distance, 3),
+                }, round(saved, 1)
+        return None, 0
+
+    def _best_target(self, grid, latitude, longitude, worse_than, waits):
+        """Lowest-scoring hospital in `grid` with a score below `worse_than`.
+
+        Searches grid rings outward and stops once the travel time alone to
+        the next ring exceeds the best score found so far. Hospitals whose
+        wait, or wait plus north-south travel, already loses are skipped
+        before computing the full distance.
+        """
+        lat_rad = math.radians(latitude)
+        lon_rad = math.radians(longitude)
+        cos_lat = math.cos(lat_rad)
+        # Longitude is the narrow side of a cell away from the equator
+        cell_km = grid.cell_degrees * KM_PER_DEGREE_LAT * max(cos_lat, 0.1)
+        max_radius = int(math.ceil(MAX_REROUTE_KM / cell_km)) + 1
+        center = grid.cell(latitude, longitude)
+        cells = grid.cells
+        lat_minutes = KM_PER_DEGREE_LAT * MINUTES_PER_KM
+
+        best = None
+        best_score = worse_than
+        for radius in range(max_radius + 1):
+            if (radius - 1) * cell_km * MINUTES_PER_KM >= best_score:
+                break
+            for cell in grid.ring(center, radius):
+                for load in cells.get(cell, ()):
+                    wait = waits[load.hospital_id]
+                    if wait + abs(load.latitude - latitude) * lat_minutes >= best_score:
+                        continue
+                    distance = _distance_km(lat_rad, lon_rad, cos_lat, load)
+                    if distance > MAX_REROUTE_KM:
+                        continue
+                    score = distance * MINUTES_PER_KM + wait
+                    if score < best_score:
+                        best, best_score = (score, distance, load), score
+        return best
+
+    def plan_rebalance(self, pending_requests):
+        """Plan moves of pending requests away from overloaded hospitals.
+
+        `pending_requests` rows need request_id, hospital_id, latitude,
+        longitude and priority_level. Most urgent requests are placed
+        first and each planned move is counted against the target's
+        backlog so one idle hospital does not absorb the whole region.
+        """
+        self._ensure_fresh()
+        order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+        moves = []
+        with self.lock:
+            overloaded = {
+                hospital_id for hospital_id, load in self.hospitals.items()
+                if load.available_ambulances <= 0 or load.queue_depth > load.available_ambulances
+            }
+            if not overloaded:
+                return moves
+
+            queue_extra = {}
+            targets = [
+                load for hospital_id, load in self.hospitals.items()
+                if hospital_id not in overloaded and load.has_queue_room()
+            ]
+            grid = _SpatialGrid(targets)
+            # Expected wait of each target including moves planned so far
+            waits = {load.hospital_id: load.expected_wait() for load in targets}
+
+            candidates = [r for r in pending_requests if r['hospital_id'] in overloaded]
+            candidates.sort(key=lambda r: (order.get(r['priority_level'], 4), r['request_id']))
+
+            for row in candidates:
+                source = self.hospitals[row['hospital_id']]
+                latitude, longitude = float(row['latitude']), float(row['longitude'])
+                lat_rad = math.radians(latitude)
+                distance = _distance_km(lat_rad, math.radians(longitude), math.cos(lat_rad), source)
+                wait = source.expected_wait()
+                extra = queue_extra.get(source.hospital_id, 0)
+                if extra:
+                    wait += extra * AVERAGE_SERVICE_MINUTES / max(source.available_ambulances, 1)
+                current = distance * MINUTES_PER_KM + wait
+
+                best = self._best_target(grid, latitude, longitude,
+                                         current - REROUTE_THRESHOLD_MINUTES, waits)
+                if best is None:
+                    continue
+                score, distance, load = best
+                added = queue_extra[load.hospital_id] = queue_extra.get(load.hospital_id, 0) + 1
+                waits[load.hospital_id] = load.expected_wait() + \
+                    added * AVERAGE_SERVICE_MINUTES / max(load.available_ambulances, 1)
+                if load.max_queue_size is not None and \
+                        load.queue_depth + added >= load.max_queue_size:
+                    grid.remove(load)
+                queue_extra[source.hospital_id] = extra - 1
+                moves.append({
+                    'request_id': row['request_id'],
+                    'from_hospital_id': source.hospital_id,
+                    'to_hospital_id': load.hospital_id,
+                    'distance_to_hospital': distance,
+                    'estimated_arrival_time': int(distance * MINUTES_PER_KM),
+                    'minutes_saved': round(current - score, 1),
+                })
+        return moves
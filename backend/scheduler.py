@@ -0,0 +1,351 @@
+"""Weighted priority scheduling with aging.
+
+Pending requests are kept per hospital in an in-process structure that is
+hydrated from the database once and then updated as requests are created,
+assigned or cancelled, so polling the queue no longer re-sorts in SQL.
+
+The in-memory queues are per process. Admission (max_queue_size) is
+therefore checked against the database, which every worker shares.
+"""
+import heapq
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+PRIORITY_LEVELS = ['critical', 'high', 'medium', 'low']
+DEFAULT_PRIORITY_WEIGHTS = {'critical': 4, 'high': 3, 'medium': 2, 'low': 1}
+MAX_PRIORITY_WEIGHT = 1000
+
+# Every aging_minutes of waiting adds one more multiple of the weight;
+# configurable per hospital, 0 disables aging
+DEFAULT_AGING_MINUTES = 30
+MAX_AGING_MINUTES = 7 * 24 * 60
+DEFAULT_MAX_QUEUE_SIZE = 50
+MAX_QUEUE_SIZE_LIMIT = 10000
+
+# Re-read from the database periodically so other workers' writes show up
+QUEUE_REFRESH_SECONDS = 30
+
+
+def priority_score(weight, waiting_time, aging_minutes=None):
+    """Score used by weighted priority scheduling: weight x f(wait time).
+
+    Without aging the score is just the weight. With aging every
+    `aging_minutes` of waiting adds one more multiple of the weight.
+    """
+    if not aging_minutes:
+        return weight
+    return weight * (1 + waiting_time / aging_minutes)
+
+
+def parse_priority_weights(raw):
+    """Merge stored priority_weights JSON over the defaults.
+
+    Lenient, for values already in the database; validate user input with
+    validate_priority_weights.
+    """
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    if not raw:
+        return weights
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode()
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return weights
+    if isinstance(raw, dict):
+        for level in PRIORITY_LEVELS:
+            if level in raw:
+                try:
+                    weights[level] = float(raw[level])
+                except (TypeError, ValueError):
+                    pass
+    return weights
+
+
+def _parse_int_setting(name, value, minimum, maximum):
+    if isinstance(value, bool):
+        raise ValueError(f'{name} must be an integer')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if number != value and not isinstance(value, str):
+        raise ValueError(f'{name} must be an integer')
+    if not minimum <= number <= maximum:
+        raise ValueError(f'{name} must be between {minimum} and {maximum}')
+    return number
+
+
+def validate_priority_weights(raw):
+    """Validate user-supplied priority_weights and merge them over the defaults; raises ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError('priority_weights must be an object')
+    weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+    for level, value in raw.items():
+        if level not in PRIORITY_LEVELS:
+            raise ValueError(f'Unknown priority level in priority_weights: {level}')
+        if isinstance(value, bool):
+            raise ValueError(f'priority_weights.{level} must be a number')
+        try:
+            weight = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'priority_weights.{level} must be a number')
+        if not math.isfinite(weight) or not 0 < weight <= MAX_PRIORITY_WEIGHT:
+            raise ValueError(f'priority_weights.{level} must be greater than 0 and at most {MAX_PRIORITY_WEIGHT}')
+        weights[level] = weight
+    return weights
+
+
+def parse_max_queue_size(value):
+    """Validate a max_queue_size setting; raises ValueError."""
+    return _parse_int_setting('max_queue_size', value, 1, MAX_QUEUE_SIZE_LIMIT)
+
+
+def parse_aging_minutes(value):
+    """Validate an aging_minutes setting (0 disables aging); raises ValueError."""
+    return _parse_int_setting('aging_minutes', value, 0, MAX_AGING_MINUTES)
+
+
+class HospitalQueue:
+    """Pending requests of one hospital, grouped by priority level.
+
+    Each level is ordered by created_at; requests of a level share a
+    weight, so the oldest one always has the level's best score. The full
+    order is a merge of the levels by score at the time of the call.
+    """
+
+    def __init__(self, hospital_id, weights=None, aging_minutes=DEFAULT_AGING_MINUTES,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+        self.hospital_id = hospital_id
+        self.weights = weights or dict(DEFAULT_PRIORITY_WEIGHTS)
+        self.aging_minutes = aging_minutes
+        self.max_queue_size = max_queue_size
+        self.levels = {level: OrderedDict() for level in PRIORITY_LEVELS}
+        self.loaded_at = 0
+
+    def __len__(self):
+        return sum(len(items) for items in self.levels.values())
+
+    def is_full(self):
+        return self.max_queue_size is not None and len(self) >= self.max_queue_size
+
+    def add(self, row):
+        level = row['priority_level']
+        items = self.levels.setdefault(level, OrderedDict())
+        items[row['request_id']] = row
+        # Hydration and live inserts normally arrive in created_at order
+        last = next(reversed(items))
+        if last != row['request_id']:
+            ordered = sorted(items.values(), key=lambda r: (r['created_at'], r['request_id']))
+            items.clear()
+            for r in ordered:
+                items[r['request_id']] = r
+
+    def remove(self, request_id):
+        for items in self.levels.values():
+            if items.pop(request_id, None) is not None:
+                return True
+        return False
+
+    def _score(self, row, now):
+        waiting = max((now - row['created_at']).total_seconds() / 60.0, 0)
+        return priority_score(self.weights.get(row['priority_level'], 0), waiting, self.aging_minutes)
+
+    def peek(self, now=None):
+        now = now or datetime.now()
+        best = None
+        best_key = None
+        for items in self.levels.values():
+            if not items:
+                continue
+            head = items[next(iter(items))]
+            key = (-self._score(head, now), head['created_at'])
+            if best_key is None or key < best_key:
+                best, best_key = head, key
+        return best
+
+    def ordered(self, now=None):
+        """Return the queue in scheduling order with scores attached."""
+        now = now or datetime.now()
+
+        def keyed(items):
+            for row in items.values():
+                yield (-self._score(row, now), row['created_at'], row['request_id']), row
+
+        result = []
+        for (neg_score, _, _), row in heapq.merge(*(keyed(items) for items in self.levels.values())):
+            entry = dict(row)
+            entry['priority_score'] = round(-neg_score, 3)
+            entry['waiting_time'] = int(max((now - row['created_at']).total_seconds(), 0) // 60)
+            result.append(entry)
+        return result
+
+
+class SchedulingQueues:
+    """Registry of per-hospital queues, hydrated lazily from the database.
+
+    Database reads happen outside the registry lock. A hospital being
+    (re)loaded records live adds/removes in a journal that is replayed on
+    the fresh queue before it is swapped in, so no change is lost.
+    """
+
+    PENDING_QUERY = """
+    SELECT er.*, p.name as patient_name, p.phone
+    FROM emergency_requests er
+    JOIN patients p ON er.patient_id = p.patient_id
+    WHERE er.hospital_id = %s AND er.status = 'pending'
+    ORDER BY er.created_at ASC
+    """
+
+    REQUESTS_QUERY = """
+    SELECT er.*, p.name as patient_name, p.phone
+    FROM emergency_requests er
+    JOIN patients p ON er.patient_id = p.patient_id
+    WHERE er.request_id IN ({placeholders})
+    """
+    REQUESTS_CHUNK_SIZE = 500
+
+    SETTINGS_QUERY = """
+    SELECT priority_weights, max_queue_size, aging_minutes
+    FROM hospital_scheduling WHERE hospital_id = %s
+    """
+
+    PENDING_COUNT_QUERY = """
+    SELECT COUNT(*) AS pending FROM emergency_requests
+    WHERE hospital_id = %s AND status = 'pending'
+    """
+
+    def __init__(self, db, refresh_seconds=QUEUE_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.queues = {}
+        self.lock = threading.Lock()
+        # hospital_id -> lock held while that hospital's queue is loading
+        self.load_locks = {}
+        # hospital_id -> changes seen while it is loading
+        self.journals = {}
+
+    def _load(self, hospital_id):
+        settings = self.db.execute_query(self.SETTINGS_QUERY, (hospital_id,))
+        weights = None
+        max_queue_size = DEFAULT_MAX_QUEUE_SIZE
+        aging_minutes = DEFAULT_AGING_MINUTES
+        if settings:
+            weights = parse_priority_weights(settings[0].get('priority_weights'))
+            if settings[0].get('max_queue_size') is not None:
+                max_queue_size = settings[0]['max_queue_size']
+            if settings[0].get('aging_minutes') is not None:
+                aging_minutes = settings[0]['aging_minutes']
+
+        queue = HospitalQueue(hospital_id, weights, aging_minutes=aging_minutes,
+                              max_queue_size=max_queue_size)
+        for row in self.db.execute_query(self.PENDING_QUERY, (hospital_id,)) or []:
+            queue.add(row)
+        queue.loaded_at = time.monotonic()
+        return queue
+
+    def _is_fresh(self, queue):
+        return queue is not None and time.monotonic() - queue.loaded_at <= self.refresh_seconds
+
+    def get(self, hospital_id):
+        queue = self.queues.get(hospital_id)
+        if self._is_fresh(queue):
+            return queue
+
+        with self.lock:
+            load_lock = self.load_locks.setdefault(hospital_id, threading.Lock())
+        # Only callers of this hospital wait for its load
+        with load_lock:
+            queue = self.queues.get(hospital_id)
+            if self._is_fresh(queue):
+                return queue
+
+            with self.lock:
+                self.journals[hospital_id] = []
+            try:
+                queue = self._load(hospital_id)
+            except Exception:
+                with self.lock:
+                    self.journals.pop(hospital_id, None)
+                raise
+
+            with self.lock:
+                for action, value in self.journals.pop(hospital_id, []):
+                    if action == 'add':
+                        queue.add(value)
+                    elif action == 'remove':
+                        queue.remove(value)
+                    else:
+                        # Invalidated mid-load: settings may be stale, reload next time
+                        queue.loaded_at = 0
+                self.queues[hospital_id] = queue
+            return queue
+
+    def _apply(self, hospital_id, action, value):
+        """Apply a change to the live queue and any in-progress load (lock held)."""
+        queue = self.queues.get(hospital_id)
+        if queue is not None:
+            if action == 'add':
+                queue.add(value)
+            else:
+                queue.remove(value)
+        journal = self.journals.get(hospital_id)
+        if journal is not None:
+            journal.append((action, value))
+
+    def add_request(self, hospital_id, request_id):
+        """Insert a newly created pending request into its hospital's queue."""
+        self.add_requests([(hospital_id, request_id)])
+
+    def add_requests(self, requests):
+        """Insert pending requests, given as (hospital_id, request_id) pairs.
+
+        Requests of hospitals that are not hydrated are skipped; their next
+        get() includes them. The rest are read in a few IN queries.
+        """
+        wanted = {
+            request_id: hospital_id for hospital_id, request_id in requests
+            if hospital_id in self.queues or hospital_id in self.journals
+        }
+        ids = list(wanted)
+        for start in range(0, len(ids), self.REQUESTS_CHUNK_SIZE):
+            chunk = ids[start:start + self.REQUESTS_CHUNK_SIZE]
+            query = self.REQUESTS_QUERY.format(placeholders=', '.join(['%s'] * len(chunk)))
+            rows = self.db.execute_query(query, tuple(chunk)) or []
+            with self.lock:
+                for row in rows:
+                    if row['status'] == 'pending' and row['hospital_id'] == wanted[row['request_id']]:
+                        self._apply(row['hospital_id'], 'add', row)
+
+    def remove_request(self, hospital_id, request_id):
+        with self.lock:
+            self._apply(hospital_id, 'remove', request_id)
+
+    def is_full(self, hospital_id):
+        """Whether the hospital's pending queue has reached max_queue_size.
+
+        The limit comes from the cached settings, the count from the
+        database so it holds across workers. It is a soft limit: concurrent
+        submissions can overshoot it by the number in flight.
+        """
+        queue = self.get(hospital_id)
+        if queue.max_queue_size is None:
+            return False
+        rows = self.db.execute_query(self.PENDING_COUNT_QUERY, (hospital_id,))
+        pending = rows[0]['pending'] if rows else len(queue)
+        return pending >= queue.max_queue_size
+
+    def invalidate(self, hospital_id=None):
+        with self.lock:
+            if hospital_id is None:
+                self.queues.clear()
+            else:
+                self.queues.pop(hospital_id, None)
+            for loading, journal in self.journals.items():
+                if hospital_id is None or loading == hospital_id:
+                    journal.append(('invalidate', None))
@@ -0,0 +1,442 @@
+"""Discrete-event simulator for comparing scheduling algorithms offline.
+
+Replays historical or synthetic emergency requests for a single hospital
+through the same scheduling policies used by the live queue (priority, FCFS,
+SJF, HRRN) under the hospital's Banker's resource limits, and reports wait
+times per priority level, throughput and resource utilization.
+"""
+import heapq
+import math
+import multiprocessing
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from scheduler import PRIORITY_LEVELS, DEFAULT_PRIORITY_WEIGHTS, DEFAULT_AGING_MINUTES, priority_score
+
+DEFAULT_PRIORITY_MIX = {'critical': 0.1, 'high': 0.2, 'medium': 0.4, 'low': 0.3}
+SIMULATION_ALGORITHMS = ['priority', 'fcfs', 'sjf', 'hrrn']
+
+MINUTES_PER_DAY = 24 * 60
+
+# Bounds for sweeps requested over the API
+MAX_SIMULATED_RESOURCES = 1000
+MAX_SWEEP_CONFIGS = 64
+# Requests simulated per sweep, summed over every configuration
+MAX_SWEEP_REQUESTS = 2_000_000
+MAX_SWEEP_PROCESSES = min(4, os.cpu_count() or 1)
+
+# Event types (arrivals sort before releases at the same instant)
+ARRIVAL = 0
+RELEASE = 1
+
+
+class SimulatedRequest:
+    """A single emergency request as seen by the simulator."""
+    __slots__ = ('request_id', 'priority_level', 'arrival', 'distance',
+                 'eta', 'service_time', 'needs_room', 'started')
+
+    def __init__(self, request_id, priority_level, arrival, distance, eta, service_time):
+        self.request_id = request_id
+        self.priority_level = priority_level
+        self.arrival = arrival
+        self.distance = distance
+        self.eta = eta
+        self.service_time = service_time
+        # Mirrors assign_ambulance: critical/high requests also take a room
+        self.needs_room = priority_level in ('critical', 'high')
+        self.started = None
+
+    def to_tuple(self):
+        return (self.request_id, self.priority_level, self.arrival,
+                self.distance, self.eta, self.service_time)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+
+def estimate_service_time(eta):
+    """Round trip to the patient plus on-scene handling, in minutes."""
+    return max(eta, 1) * 2 + 15
+
+
+# Ready queues: one per scheduling algorithm. key(req, now) orders requests
+# across two queues of the same algorithm; lower runs first.
+class _FCFSQueue:
+    def __init__(self, config):
+        self.items = deque()
+
+    def push(self, req):
+        self.items.append(req)
+
+    def peek(self, now):
+        return self.items[0] if self.items else None
+
+    def key(self, req, now):
+        return (req.arrival, req.request_id)
+
+    def pop(self, req):
+        self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _SJFQueue:
+    def __init__(self, config):
+        self.heap = []
+
+    def push(self, req):
+        heapq.heappush(self.heap, (req.distance, req.arrival, req.request_id, req))
+
+    def peek(self, now):
+        return self.heap[0][3] if self.heap else None
+
+    def key(self, req, now):
+        return (req.distance, req.arrival, req.request_id)
+
+    def pop(self, req):
+        heapq.heappop(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class _PriorityQueue:
+    """Weighted priority with optional aging.
+
+    Requests of the same level share a weight, so each level is a FIFO and
+    the oldest request of a level always has that level's best score; the
+    next request is the best of at most four level heads.
+    """
+
+    def __init__(self, config):
+        self.weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+        self.weights.update(config.get('priority_weights') or {})
+        self.aging_minutes = config.get('aging_minutes')
+        self.levels = {level: deque() for level in PRIORITY_LEVELS}
+        self.size = 0
+
+    def push(self, req):
+        self.levels[req.priority_level].append(req)
+        self.size += 1
+
+    def peek(self, now):
+        best = None
+        best_key = None
+        for level, items in self.levels.items():
+            if not items:
+                continue
+            head = items[0]
+            key = self.key(head, now)
+            if best_key is None or key < best_key:
+                best, best_key = head, key
+        return best
+
+    def key(self, req, now):
+        score = priority_score(self.weights.get(req.priority_level, 0), now - req.arrival, self.aging_minutes)
+        return (-score, req.arrival)
+
+    def pop(self, req):
+        self.levels[req.priority_level].popleft()
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+
+class _HRRNQueue:
+    """Highest Response Ratio Next.
+
+    The ratio 1 + wait / burst changes with time, but requests sharing a
+    burst keep their relative order, so they are bucketed by burst as
+    FIFOs and each pick compares only the bucket heads. ETAs are whole
+    minutes, so there are few distinct bursts even under heavy backlog.
+    """
+
+    def __init__(self, config):
+        self.buckets = {}
+        self.size = 0
+
+    def push(self, req):
+        burst = max(req.eta, 1)
+        bucket = self.buckets.get(burst)
+        if bucket is None:
+            bucket = self.buckets[burst] = deque()
+        bucket.append(req)
+        self.size += 1
+
+    def peek(self, now):
+        best = None
+        best_key = None
+        for bucket in self.buckets.values():
+            head = bucket[0]
+            key = self.key(head, now)
+            if best_key is None or key < best_key:
+                best, best_key = head, key
+        return best
+
+    def key(self, req, now):
+        burst = max(req.eta, 1)
+        return (-(now - req.arrival + burst) / burst, req.arrival)
+
+    def pop(self, req):
+        burst = max(req.eta, 1)
+        bucket = self.buckets[burst]
+        bucket.popleft()
+        if not bucket:
+            del self.buckets[burst]
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+
+READY_QUEUES = {
+    'priority': _PriorityQueue,
+    'fcfs': _FCFSQueue,
+    'sjf': _SJFQueue,
+    'hrrn': _HRRNQueue,
+}
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(math.ceil(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+
+def simulate(requests, resources, config=None):
+    """Run one simulation and return its metrics.
+
+    `requests` is an iterable of SimulatedRequest (or their tuples) and
+    `resources` maps 'ambulance'/'doctor'/'room' to hospital capacity.
+    Dispatch is non-preemptive and follows the algorithm's order. Requests
+    that need a room are queued apart from the rest: while every room is
+    taken they wait, and the best request that needs no room goes ahead of
+    them. `room_bypasses` counts those dispatches.
+    """
+    config = config or {}
+    algorithm = config.get('algorithm', 'priority')
+    if algorithm not in READY_QUEUES:
+        raise ValueError(f'Unknown algorithm: {algorithm}')
+
+    capacity = {
+        'ambulance': int(resources.get('ambulance', 0)),
+        'doctor': int(resources.get('doctor', 0)),
+        'room': int(resources.get('room', 0)),
+    }
+    available = dict(capacity)
+    busy_time = {resource: 0.0 for resource in capacity}
+
+    events = []
+    seq = 0
+    for req in requests:
+        if not isinstance(req, SimulatedRequest):
+            req = SimulatedRequest.from_tuple(req)
+        events.append((req.arrival, ARRIVAL, seq, req))
+        seq += 1
+    heapq.heapify(events)
+    total_requests = seq
+
+    queue_class = READY_QUEUES[algorithm]
+    room_queue = queue_class(config)
+    plain_queue = queue_class(config)
+    waits = {level: [] for level in PRIORITY_LEVELS}
+    completed = 0
+    start_time = events[0][0] if events else 0
+    now = start_time
+    max_queue = 0
+    room_bypasses = 0
+
+    while events:
+        now, kind, _, req = heapq.heappop(events)
+        if kind == ARRIVAL:
+            (room_queue if req.needs_room else plain_queue).push(req)
+            queued = len(room_queue) + len(plain_queue)
+            if queued > max_queue:
+                max_queue = queued
+        else:
+            completed += 1
+            available['ambulance'] += 1
+            available['doctor'] += 1
+            if req.needs_room:
+                available['room'] += 1
+
+        # Drain every event at this instant before dispatching
+        if events and events[0][0] == now:
+            continue
+
+        while available['ambulance'] >= 1 and available['doctor'] >= 1:
+            nxt = plain_queue.peek(now)
+            queue = plain_queue
+            room_head = room_queue.peek(now)
+            if room_head is not None:
+                if available['room'] < 1:
+                    if nxt is not None and room_queue.key(room_head, now) < plain_queue.key(nxt, now):
+                        room_bypasses += 1
+                elif nxt is None or room_queue.key(room_head, now) < plain_queue.key(nxt, now):
+                    nxt, queue = room_head, room_queue
+            if nxt is None:
+                break
+            rooms = 1 if nxt.needs_room else 0
+            queue.pop(nxt)
+            available['ambulance'] -= 1
+            available['doctor'] -= 1
+            available['room'] -= rooms
+            busy_time['ambulance'] += nxt.service_time
+            busy_time['doctor'] += nxt.service_time
+            busy_time['room'] += nxt.service_time * rooms
+            nxt.started = now
+            waits[nxt.priority_level].append(now - nxt.arrival)
+            heapq.heappush(events, (now + nxt.service_time, RELEASE, seq, nxt))
+            seq += 1
+
+    horizon = max(now - start_time, 1e-9)
+    wait_stats = {}
+    for level, values in waits.items():
+        values.sort()
+        wait_stats[level] = {
+            'count': len(values),
+            'mean': (sum(values) / len(values)) if values else None,
+            'p90': _percentile(values, 90),
+            'max': values[-1] if values else None,
+        }
+
+    return {
+        'algorithm': algorithm,
+        'priority_weights': config.get('priority_weights'),
+        'aging_minutes': config.get('aging_minutes'),
+        'requests': total_requests,
+        'completed': completed,
+        'unserved': len(room_queue) + len(plain_queue),
+        'room_bypasses': room_bypasses,
+        'simulated_minutes': horizon,
+        'throughput_per_day': completed / horizon * MINUTES_PER_DAY,
+        'max_queue_length': max_queue,
+        'wait_time_by_priority': wait_stats,
+        'utilization': {
+            resource: (busy_time[resource] / (capacity[resource] * horizon)) if capacity[resource] else None
+            for resource in capacity
+        },
+    }
+
+
+def generate_synthetic_requests(days, arrivals_per_hour, priority_mix=None,
+                                mean_distance_km=5.0, seed=None):
+    """Generate a Poisson arrival process over `days` simulated days."""
+    rng = random.Random(seed)
+    mix = priority_mix or DEFAULT_PRIORITY_MIX
+    levels = list(mix.keys())
+    cumulative = []
+    total = 0.0
+    for level in levels:
+        total += mix[level]
+        cumulative.append(total)
+
+    horizon = days * MINUTES_PER_DAY
+    rate = arrivals_per_hour / 60.0
+    requests = []
+    now = 0.0
+    request_id = 0
+    while rate > 0:
+        now += rng.expovariate(rate)
+        if now >= horizon:
+            break
+        draw = rng.random() * total
+        level = levels[-1]
+        for candidate, bound in zip(levels, cumulative):
+            if draw < bound:
+                level = candidate
+                break
+        distance = rng.expovariate(1.0 / mean_distance_km)
+        # Same estimate as create_emergency_request: 3 minutes per km
+        eta = int(distance * 3)
+        request_id += 1
+        requests.append((request_id, level, now, distance, eta, estimate_service_time(eta)))
+    return requests
+
+
+def load_historical_requests(db, hospital_id, since=None, limit=None):
+    """Load a hospital's emergency_requests (oldest `limit`) as simulator input tuples."""
+    query = """
+    SELECT request_id, priority_level, created_at, assigned_at, completed_at,
+           distance_to_hospital, estimated_arrival_time
+    FROM emergency_requests
+    WHERE hospital_id = %s AND status <> 'cancelled'
+    """
+    params = [hospital_id]
+    if since:
+        query += " AND created_at >= %s"
+        params.append(since)
+    query += " ORDER BY created_at ASC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    rows = db.execute_query(query, tuple(params))
+
+    if not rows:
+        return []
+
+    origin = rows[0]['created_at']
+    requests = []
+    for row in rows:
+        eta = row['estimated_arrival_time'] or 0
+        service_time = estimate_service_time(eta)
+        if row['assigned_at'] and row['completed_at']:
+            observed = (row['completed_at'] - row['assigned_at']).total_seconds() / 60.0
+            if observed > 0:
+                service_time = observed
+        requests.append((
+            row['request_id'],
+            row['priority_level'],
+            (row['created_at'] - origin).total_seconds() / 60.0,
+            float(row['distance_to_hospital'] or 0),
+            eta,
+            service_time,
+        ))
+    return requests
+
+
+def _simulate_task(args):
+    requests, resources, config = args
+    return simulate(requests, resources, config)
+
+
+def run_sweep(requests, resources, configs, processes=None):
+    """Simulate every config against the same workload across a process pool."""
+    requests = [r.to_tuple() if isinstance(r, SimulatedRequest) else tuple(r) for r in requests]
+    tasks = [(requests, resources, config) for config in configs]
+    processes = min(processes or MAX_SWEEP_PROCESSES, MAX_SWEEP_PROCESSES, len(tasks))
+    if processes <= 1:
+        return [_simulate_task(task) for task in tasks]
+    # Spawn rather than fork: the API process runs background threads whose
+    # locks a forked child could inherit mid-update
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        return list(executor.map(_simulate_task, tasks))
+
+
+def build_sweep_configs(algorithms=None, priority_weights_options=None, aging_options=None):
+    """Expand algorithms x priority_weights x aging into simulation configs.
+
+    Weights and aging only affect the priority algorithm, so the other
+    algorithms get a single config each. The defaults match the live
+    queue's defaults, so the priority run models production.
+    """
+    configs = []
+    for algorithm in algorithms or SIMULATION_ALGORITHMS:
+        if algorithm != 'priority':
+            configs.append({'algorithm': algorithm})
+            continue
+        for weights in priority_weights_options or [DEFAULT_PRIORITY_WEIGHTS]:
+            for aging in aging_options or [DEFAULT_AGING_MINUTES]:
+                configs.append({
+                    'algorithm': algorithm,
+                    'priority_weights': weights,
+                    'aging_minutes': aging,
+                })
+    return configs
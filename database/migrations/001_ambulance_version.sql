@@ -0,0 +1,7 @@
+-- Adds the optimistic-locking version column to existing databases
+-- (new installs get it from schema.sql)
+
+USE rapidaid;
+
+ALTER TABLE ambulances
+    ADD COLUMN version INT NOT NULL DEFAULT 0 AFTER status;
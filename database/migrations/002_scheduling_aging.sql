@@ -0,0 +1,10 @@
+-- Per-hospital aging for weighted priority scheduling, and an index for
+-- the pending-queue admission count (new installs get both from schema.sql)
+
+USE rapidaid;
+
+ALTER TABLE hospital_scheduling
+    ADD COLUMN aging_minutes INT NOT NULL DEFAULT 30 AFTER max_queue_size;
+
+ALTER TABLE emergency_requests
+    ADD INDEX idx_hospital_status (hospital_id, status);
@@ -43,6 +43,7 @@ CREATE TABLE ambulances (
     hospital_id INT NOT NULL,
     vehicle_number VARCHAR(20) UNIQUE NOT NULL,
     status ENUM('available', 'assigned', 'in_transit', 'at_patient', 'returning') DEFAULT 'available',
+    version INT NOT NULL DEFAULT 0, -- bumped on every status change (optimistic locking)
     current_latitude DECIMAL(10, 8),
     current_longitude DECIMAL(11, 8),
     driver_name VARCHAR(100),
@@ -93,6 +94,7 @@ CREATE TABLE emergency_requests (
     INDEX idx_priority (priority_level),
     INDEX idx_patient (patient_id),
     INDEX idx_hospital (hospital_id),
+    INDEX idx_hospital_status (hospital_id, status),
     INDEX idx_created (created_at)
 );
 
@@ -135,6 +137,7 @@ CREATE TABLE hospital_scheduling (
     algorithm ENUM('priority', 'fcfs', 'sjf', 'hrrn') NOT NULL DEFAULT 'priority',
     priority_weights JSON, -- Store weights for different priority levels
     max_queue_size INT DEFAULT 50,
+    aging_minutes INT NOT NULL DEFAULT 30, -- 0 disables aging
     average_response_time DECIMAL(8, 2) DEFAULT 0, -- in minutes
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,